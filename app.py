@@ -1,15 +1,22 @@
 import os
+import gzip
+import time
 import logging
 from pathlib import Path
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_file
 
-from utils.torrent_creator import create_torrent
-from utils.nfo_generator import generate_nfo
-from utils.hardlink_manager import create_hardlink
-from utils.discord_notifier import send_discord_notification
+from utils.torrent_creator import CHECKSUM_KINDS, create_torrent, piece_length
+from utils.nfo_generator import generate_nfo, render_nfo
+from utils.hardlink_manager import create_hardlink, link_file
+from utils.discord_notifier import send_discord_notification, start_outbox_worker, pending_notifications
 from utils.radarr_integration import get_radarr_generated_name
 from utils.bbcode_generator import generate_bbcode_description, save_bbcode_file
+from utils import duplicates, library_index, manifest, metrics, profiling, release_status
+from utils import job_history, prehash, remote_worker, rerender, shared_cache, timeline, warmup
+from utils.atomic_io import atomic_write_text
+from utils.job_coalescer import JobCoalescer
+from utils.directory_listing import list_directory, query_listing
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,6 +31,9 @@ CONFIG = {
     'CONFIG_PATH': os.getenv('CONFIG_PATH', '/config'),
     'TRACKER_URL': os.getenv('TRACKER_URL', ''),
     'PIECE_SIZE': int(os.getenv('PIECE_SIZE', '0')),
+    # Checksum sidecars written next to the torrent: sfv, sha256
+    'CHECKSUMS': [c.strip() for c in os.getenv('CHECKSUMS', '').split(',') if c.strip()],
+    'REJECT_DUPLICATES': os.getenv('REJECT_DUPLICATES', 'false').lower() == 'true',
     'PRIVATE_TORRENT': os.getenv('PRIVATE_TORRENT', 'false').lower() == 'true',
     'AUTO_HARDLINK': os.getenv('AUTO_HARDLINK', 'true').lower() == 'true',
     'NFO_TEMPLATE': os.getenv('NFO_TEMPLATE', 'full'),
@@ -34,12 +44,65 @@ CONFIG = {
     'SONARR_API_KEY': os.getenv('SONARR_API_KEY', ''),
     'USE_RADARR_NAMES': os.getenv('USE_RADARR_NAMES', 'false').lower() == 'true',
     'TMDB_API_KEY': os.getenv('TMDB_API_KEY', ''),
+    'BROWSE_PAGE_SIZE': int(os.getenv('BROWSE_PAGE_SIZE', '500')),
     'PUID': int(os.getenv('PUID', '99')),
     'PGID': int(os.getenv('PGID', '100'))
 }
 
 VIDEO_EXTS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
 
+# Contents rendered by /preview are kept this long for the next /create
+PREVIEW_TTL = 3600
+
+# In-flight /create runs, keyed by resolved source path (the lock files
+# extend the deduplication across worker processes)
+create_jobs = JobCoalescer(lock_dir=os.path.join(CONFIG['CONFIG_PATH'], 'locks'))
+metrics.JOBS_IN_FLIGHT.set_function(create_jobs.in_flight)
+metrics.JOBS_WAITING.set_function(create_jobs.waiting)
+metrics.DISCORD_OUTBOX.set_function(pending_notifications)
+
+
+def stage_timer(stage):
+    """Time one /create pipeline stage"""
+    return metrics.CREATE_STAGE_SECONDS.time(stage=stage)
+
+
+def progress_logger(action, name, step=10):
+    """Progress callback logging a long copy or hash every `step` percent"""
+    logged = [0]
+
+    def progress(copied, total):
+        percent = int(copied * 100 / total) if total else 100
+        if percent >= logged[0] + step or copied == total:
+            logged[0] = percent
+            logger.info(f"{action} {name}: {percent}% ({copied / 1024 ** 3:.1f} / {total / 1024 ** 3:.1f} GB)")
+
+    return progress
+
+# Responses worth compressing (large /browse listings, /metrics, profiles)
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html'}
+COMPRESS_MIN_SIZE = 1024
+
+@app.after_request
+def compress_response(response):
+    """gzip text responses for clients that accept it"""
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = str(len(response.get_data()))
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html', config=CONFIG)
@@ -48,42 +111,140 @@ def index():
 def health():
     return jsonify({'status': 'healthy'}), 200
 
+@app.route('/ready')
+def ready():
+    """Startup warm-up progress; 503 until the caches are warm and the tools found"""
+    state = warmup.status()
+    return jsonify(state), 200 if state['ready'] else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for every worker process"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request profiles (enable with ?profile=1 or PROFILE_REQUESTS)"""
+    return jsonify({'profiles': profiling.list_profiles()})
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Stage timeline and top functions of one profiled request"""
+    path = profiling.profile_path(profile_id, '.json')
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/json')
+
+@app.route('/profiles/<profile_id>/download', methods=['GET'])
+def download_profile(profile_id):
+    """Raw cProfile data, for pstats / snakeviz"""
+    path = profiling.profile_path(profile_id, '.prof')
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.prof")
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Recent /create jobs with their timeline summary, newest first"""
+    try:
+        limit = min(1000, max(1, int(request.args.get('limit', 100))))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    return jsonify({'jobs': job_history.list_jobs(limit)})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Parameters, results and full timeline of one /create job"""
+    job = job_history.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/browse', methods=['GET'])
+@profiling.profiled('browse')
 def browse_files():
     """Browse media directory for video files"""
     try:
         path = request.args.get('path', CONFIG['MEDIA_PATH'])
         path_obj = Path(path)
         
-        if not path_obj.exists():
+        if not path_obj.is_dir():
             return jsonify({'error': 'Path does not exist'}), 404
 
-        items = []
-        for item in sorted(path_obj.iterdir()):
-            if item.is_dir():
-                items.append({
-                    'name': item.name,
-                    'path': str(item),
-                    'type': 'directory'
-                })
-            elif item.suffix.lower() in VIDEO_EXTS:
-                items.append({
-                    'name': item.name,
-                    'path': str(item),
-                    'type': 'file',
-                    'size': item.stat().st_size
-                })
+        # Pagination, sorting and filtering (limit=0 returns everything)
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = int(request.args.get('limit', CONFIG['BROWSE_PAGE_SIZE']))
+        except ValueError:
+            return jsonify({'error': 'Invalid offset or limit'}), 400
+        sort = request.args.get('sort', 'name')
+        order = request.args.get('order', 'asc')
+        if sort not in ('name', 'size', 'mtime') or order not in ('asc', 'desc'):
+            return jsonify({'error': 'Invalid sort or order'}), 400
+        item_type = request.args.get('type') or None
+        if item_type not in (None, 'file', 'directory'):
+            return jsonify({'error': 'Invalid type'}), 400
+
+        listing, cached = list_directory(str(path_obj), VIDEO_EXTS)
+        items, total = query_listing(
+            listing,
+            query=request.args.get('q', '').strip(),
+            item_type=item_type,
+            sort=sort,
+            order=order,
+            offset=offset,
+            limit=limit if limit > 0 else None
+        )
+        if request.args.get('annotate', 'true').lower() != 'false':
+            items = release_status.annotate(
+                items, CONFIG['TORRENT_PATH'], CONFIG['USE_RADARR_NAMES']
+            )
 
         return jsonify({
             'current_path': str(path_obj),
             'parent_path': str(path_obj.parent) if path_obj.parent != path_obj else None,
-            'items': items
+            'items': items,
+            'total': total,
+            'offset': offset,
+            'has_more': offset + len(items) < total,
+            'cached': cached
         })
         
     except Exception as e:
         logger.exception('Error browsing files')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/search', methods=['GET'])
+def search_library():
+    """Search every video file under MEDIA_PATH by file or release name"""
+    try:
+        query = request.args.get('q', '').strip()
+        try:
+            limit = min(500, max(1, int(request.args.get('limit', 100))))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+
+        start = time.perf_counter()
+        items, total = library_index.search(query, limit=limit)
+        items = release_status.annotate(
+            [dict(item, type='file') for item in items],
+            CONFIG['TORRENT_PATH'], CONFIG['USE_RADARR_NAMES']
+        )
+        took_ms = (time.perf_counter() - start) * 1000
+
+        return jsonify({
+            'query': query,
+            'items': items,
+            'total': total,
+            'took_ms': round(took_ms, 2),
+            'index': library_index.status()
+        })
+
+    except Exception as e:
+        logger.exception('Error searching library')
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/radarr/lookup', methods=['POST'])
 def radarr_lookup():
     """Lookup movie info from Radarr and get release name (sourceTitle priority)"""
@@ -128,6 +289,7 @@ def radarr_lookup():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/create', methods=['POST'])
+@profiling.profiled('create')
 def create():
     """Create torrent, NFO, BBCode description, and hardlink"""
     try:
@@ -138,112 +300,400 @@ def create():
         private = bool(data.get('private', CONFIG['PRIVATE_TORRENT']))
         create_link = bool(data.get('create_hardlink', CONFIG['AUTO_HARDLINK']))
         use_radarr = bool(data.get('use_radarr_name', CONFIG['USE_RADARR_NAMES']))
+        checksums = data.get('checksums', CONFIG['CHECKSUMS'])
+        reject_duplicates = bool(data.get('reject_duplicates', CONFIG['REJECT_DUPLICATES']))
 
         if not video_path or not Path(video_path).exists():
             return jsonify({'error': 'Invalid video file path'}), 400
+        try:
+            piece_length(piece_size, 0)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # "sfv,sha256" as in the CHECKSUMS setting, or a list
+        if isinstance(checksums, str):
+            checksums = [c.strip() for c in checksums.split(',') if c.strip()]
+        if not isinstance(checksums, list):
+            return jsonify({'error': 'checksums must be a list or a comma-separated string'}), 400
+        checksums = tuple(checksums)
+        if any(c not in CHECKSUM_KINDS for c in checksums):
+            return jsonify({'error': f"checksums must be among {', '.join(CHECKSUM_KINDS)}"}), 400
+
+        # Same encode already processed under another name? Found from the
+        # size and a few sampled chunks, before anything is hashed
+        likely_duplicates = duplicates.find_duplicates(video_path)
+        if likely_duplicates:
+            logger.warning(f"{video_path} is likely a duplicate of: "
+                           f"{', '.join(d['release_name'] or d['source_path'] for d in likely_duplicates)}")
+            if reject_duplicates:
+                return jsonify({
+                    'error': 'Likely duplicate of an already processed release',
+                    'duplicates': likely_duplicates
+                }), 409
+
+        # A double-click or a second user on the same file attaches to the
+        # run already in progress instead of hashing the file a second time
+        params = (tracker_url, piece_size, private, create_link, use_radarr, checksums)
+        (body, status), coalesced = create_jobs.run(
+            str(Path(video_path).resolve()),
+            params,
+            lambda: run_create_job(video_path, params)
+        )
+
+        if coalesced:
+            body = {**body, 'coalesced': True}
+        if likely_duplicates:
+            body = {**body, 'duplicates': likely_duplicates}
+        return jsonify(body), status
+
+    except Exception as e:
+        logger.exception('Error in create')
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """
+    Render the NFO and BBCode description of a file without hashing or
+    writing anything. Uses the cached probe and metadata; a later /create
+    with the same inputs writes these contents instead of rendering again.
+    """
+    try:
+        start = time.monotonic()
+        data = request.get_json(force=True)
+        video_path = data.get('video_path')
+        use_radarr = bool(data.get('use_radarr_name', CONFIG['USE_RADARR_NAMES']))
+
+        if not video_path or not Path(video_path).is_file():
+            return jsonify({'error': 'Invalid video file path'}), 400
 
         video_file = Path(video_path)
-        original_name = video_file.stem
-        video_name = original_name
-        radarr_movie = None
-        source_title_used = False
-        
-        # Try to get release name (sourceTitle priority) from Radarr if enabled
-        if use_radarr and CONFIG['RADARR_API_KEY'] and CONFIG['RADARR_URL']:
-            try:
-                release_name, radarr_movie = get_radarr_generated_name(
-                    video_path, 
-                    use_source_title=True
-                )
-                
-                if radarr_movie:
-                    logger.info(f"Using Radarr release name: {release_name}")
-                    video_name = release_name
-                    # Check if it's likely a sourceTitle (contains dots and quality info)
-                    source_title_used = '.' in release_name and any(
-                        q in release_name.upper() 
-                        for q in ['1080P', '720P', '2160P', 'WEB', 'BLURAY', 'HDTV']
-                    )
-                else:
-                    logger.info("Movie not found in Radarr, using original filename")
-            except Exception as e:
-                logger.error(f"Radarr lookup failed: {e}, using original filename")
-        
-        results = {}
-        results['name_info'] = {
-            'original': original_name,
-            'final': video_name,
-            'radarr_used': video_name != original_name,
-            'source_title_used': source_title_used
-        }
+        video_name, radarr_movie, source_title_used = resolve_release_name(video_path, use_radarr)
+        input_keys = render_input_keys(video_file, video_name, radarr_movie)
 
-        # Create folder named after the video file in torrents directory
+        # Rendered from the source file; render_nfo rewrites the path lines
+        # of the probe for the release folder the link will be created in
         torrent_folder = Path(CONFIG['TORRENT_PATH']) / video_name
-        torrent_folder.mkdir(parents=True, exist_ok=True)
+        contents = {
+            'nfo': render_nfo(str(video_file), CONFIG['NFO_TEMPLATE'], {
+                'release_name': video_name,
+                'original_filename': video_file.name,
+                'radarr_movie': radarr_movie,
+                'folder_name': str(torrent_folder)
+            }),
+            'bbcode': generate_bbcode_description(
+                str(video_file),
+                radarr_movie=radarr_movie,
+                release_name=video_name
+            )
+        }
+        for kind, content in contents.items():
+            if content is not None:
+                shared_cache.put('rendered', f"{kind}:{input_keys[kind]}", content, ttl=PREVIEW_TTL)
+
+        return jsonify({
+            'release_name': video_name,
+            'name_info': {
+                'original': video_file.stem,
+                'final': video_name,
+                'radarr_used': video_name != video_file.stem,
+                'source_title_used': source_title_used
+            },
+            'nfo': contents['nfo'],
+            'bbcode': contents['bbcode'],
+            'paths': {
+                'nfo': str(torrent_folder / f"{video_name}.nfo"),
+                'bbcode': str(torrent_folder / f"{video_name}_description.txt"),
+                'torrent': str(torrent_folder / f"{video_name}.torrent")
+            },
+            'duplicates': duplicates.find_duplicates(video_path),
+            'took_ms': round((time.monotonic() - start) * 1000, 1)
+        })
+
+    except Exception as e:
+        logger.exception('Error in preview')
+        return jsonify({'error': str(e)}), 500
+
+
+def run_create_job(video_path, params):
+    """
+    process_release() with its timeline recorded: stage start and end times,
+    subprocesses, HTTP calls, bytes read and cache hits/misses. The timeline
+    is returned in the response and kept with the job (see /jobs).
+    """
+    job_id = job_history.new_job_id()
+    # A profiled request already records one: share it
+    job_timeline = timeline.current() or timeline.Timeline()
+    tracker_url, piece_size, private, create_link, use_radarr, checksums = params
+    job = {
+        'id': job_id,
+        'video_path': video_path,
+        'params': {
+            'tracker_url': tracker_url,
+            'piece_size': piece_size,
+            'private': private,
+            'create_hardlink': create_link,
+            'use_radarr_name': use_radarr,
+            'checksums': list(checksums)
+        }
+    }
+    try:
+        # Speculative pre-hashing pauses while this runs
+        with prehash.interactive_job(), timeline.recording(job_timeline):
+            body, status = process_release(video_path, *params)
+    except Exception as e:
+        # Failed jobs are the ones worth looking at later: keep them too
+        job_history.save({
+            **job,
+            'release_name': None,
+            'success': False,
+            'status': 500,
+            'error': str(e),
+            'results': {},
+            'timeline': job_timeline.to_dict()
+        })
+        raise
 
-        # Create hardlink with the release name in the torrent folder
-        renamed_video_path = torrent_folder / f"{video_name}{video_file.suffix}"
+    job_history.save({
+        **job,
+        'release_name': body['results'].get('name_info', {}).get('final'),
+        'success': body['success'],
+        'status': status,
+        'results': body['results'],
+        'timeline': job_timeline.to_dict()
+    })
+    return {**body, 'job_id': job_id, 'timeline': job_timeline.to_dict()}, status
+
+
+def resolve_release_name(video_path, use_radarr):
+    """
+    Release name of a video file: Radarr sourceTitle (or name generated
+    from Radarr metadata) when enabled, otherwise the file name
+
+    Returns:
+        tuple (release name, Radarr movie or None, sourceTitle used)
+    """
+    video_name = Path(video_path).stem
+    radarr_movie = None
+    source_title_used = False
+    
+    # Try to get release name (sourceTitle priority) from Radarr if enabled
+    if use_radarr and CONFIG['RADARR_API_KEY'] and CONFIG['RADARR_URL']:
+        try:
+            release_name, radarr_movie = get_radarr_generated_name(
+                video_path, 
+                use_source_title=True
+            )
         
+            if radarr_movie:
+                logger.info(f"Using Radarr release name: {release_name}")
+                video_name = release_name
+                # Check if it's likely a sourceTitle (contains dots and quality info)
+                source_title_used = '.' in release_name and any(
+                    q in release_name.upper() 
+                    for q in ['1080P', '720P', '2160P', 'WEB', 'BLURAY', 'HDTV']
+                )
+            else:
+                logger.info("Movie not found in Radarr, using original filename")
+        except Exception as e:
+            logger.error(f"Radarr lookup failed: {e}, using original filename")
+    
+    return video_name, radarr_movie, source_title_used
+
+
+def render_input_keys(video_file, video_name, radarr_movie):
+    """Manifest input keys of the NFO and BBCode description of a release"""
+    identity = manifest.source_identity(str(video_file))
+    radarr_digest = manifest.fingerprint(radarr_movie)
+    return {
+        'nfo': manifest.fingerprint(
+            'nfo', identity, CONFIG['NFO_TEMPLATE'], video_name,
+            video_file.name, radarr_digest,
+            # Folder name shown in the NFO
+            str(Path(CONFIG['TORRENT_PATH']) / video_name)
+        ),
+        'bbcode': manifest.fingerprint('bbcode', identity, video_name, radarr_digest)
+    }
+
+
+def process_release(video_path, tracker_url, piece_size, private, create_link, use_radarr,
+                    checksums=()):
+    """
+    Run the full create pipeline for one video file
+
+    Returns:
+        tuple (response body dict, HTTP status)
+    """
+    video_file = Path(video_path)
+    original_name = video_file.stem
+    with stage_timer('radarr_lookup'):
+        video_name, radarr_movie, source_title_used = resolve_release_name(video_path, use_radarr)
+    
+    results = {}
+    results['name_info'] = {
+        'original': original_name,
+        'final': video_name,
+        'radarr_used': video_name != original_name,
+        'source_title_used': source_title_used
+    }
+
+    # Create folder named after the video file in torrents directory
+    torrent_folder = Path(CONFIG['TORRENT_PATH']) / video_name
+    torrent_folder.mkdir(parents=True, exist_ok=True)
+
+    # Create hardlink with the release name in the torrent folder
+    renamed_video_path = torrent_folder / f"{video_name}{video_file.suffix}"
+    
+    with stage_timer('link'):
         if renamed_video_path.exists():
             logger.info(f"Renamed video file already exists: {renamed_video_path}")
+            metrics.LINK_METHODS.inc(destination='torrent_folder', method='skipped')
+            results['link'] = {
+                'success': True,
+                'target': str(renamed_video_path),
+                'message': 'File already exists (skipped)',
+                'method': 'skipped'
+            }
         else:
-            # Create hardlink with the new name
-            try:
-                import os
-                os.link(str(video_file), str(renamed_video_path))
-                logger.info(f"Created hardlink: {video_file} -> {renamed_video_path}")
-            except Exception as e:
-                logger.error(f"Failed to create hardlink, copying file instead: {e}")
-                import shutil
-                shutil.copy2(str(video_file), str(renamed_video_path))
-        
-        # Now use the renamed file for NFO and torrent creation
-        video_path_for_processing = str(renamed_video_path)
+            # Hardlink with the new name, or a copy (reflink when the
+            # filesystem allows it) when source and torrent folder are on
+            # different filesystems
+            results['link'] = link_file(
+                video_file, renamed_video_path, fallback='copy', progress=progress_logger('Copying', video_name)
+            )
+            if not results['link']['success']:
+                raise OSError(results['link']['error'])
+            metrics.LINK_METHODS.inc(destination='torrent_folder', method=results['link']['method'])
+    
+    # Now use the renamed file for NFO and torrent creation
+    video_path_for_processing = str(renamed_video_path)
 
-        # NFO goes inside the folder - pass movie info for enhanced NFO
-        nfo_path = torrent_folder / f"{video_name}.nfo"
-        nfo_extra_info = {
-            'release_name': video_name,
-            'original_filename': video_file.name,
-            'radarr_movie': radarr_movie
+    # Inputs each output depends on; an output whose inputs and file
+    # content are unchanged since the last run is reused as-is
+    source_key = str(video_file.resolve())
+    identity = manifest.source_identity(str(video_file))
+    torrent_inputs = ['torrent', identity, tracker_url, piece_size, private, video_name]
+    if checksums:
+        # Only when requested, so existing keys stay valid
+        torrent_inputs.append(sorted(checksums))
+    input_keys = {
+        **render_input_keys(video_file, video_name, radarr_movie),
+        'torrent': manifest.fingerprint(*torrent_inputs)
+    }
+    reused = []
+    regenerated = []
+    # Inputs of the release, so descriptions can be re-rendered in bulk later
+    manifest.record_release(source_key, video_name, video_path_for_processing,
+                            video_file.name, radarr_movie)
+
+    def reuse(kind):
+        """Return a result dict for an unchanged output, or None"""
+        existing = manifest.is_current(source_key, kind, input_keys[kind])
+        if not existing:
+            return None
+        logger.info(f"{kind} unchanged, reusing: {existing}")
+        reused.append(kind)
+        return {
+            'success': True,
+            'path': existing,
+            'message': 'Unchanged since last run (reused)',
+            'reused': True
         }
-        results['nfo'] = generate_nfo(
-            video_path_for_processing,  # Use renamed file
-            str(nfo_path), 
-            CONFIG['NFO_TEMPLATE'],
-            extra_info=nfo_extra_info
-        )
 
-        # Generate BBCode description file
-        bbcode_content = generate_bbcode_description(
-            video_path_for_processing,
-            radarr_movie=radarr_movie,
-            release_name=video_name
-        )
-        
-        if bbcode_content:
-            bbcode_path = torrent_folder / f"{video_name}_description.txt"
-            results['bbcode'] = save_bbcode_file(bbcode_content, str(bbcode_path))
-        else:
-            results['bbcode'] = {
-                'success': False,
-                'message': 'Failed to generate BBCode description'
+    def remember(kind, result):
+        if result.get('success'):
+            regenerated.append(kind)
+            manifest.record_output(
+                source_key, kind, input_keys[kind], result['path'], video_name
+            )
+
+    def from_preview(kind, output_path):
+        # Content rendered by /preview for exactly these inputs
+        content = shared_cache.get('rendered', f"{kind}:{input_keys[kind]}")
+        if content is None:
+            return None
+        try:
+            atomic_write_text(output_path, content)
+        except OSError as e:
+            logger.warning(f"Could not write previewed {kind}, rendering again: {e}")
+            return None
+        logger.info(f"{kind} written from preview: {output_path}")
+        result = {
+            'success': True,
+            'path': str(output_path),
+            'message': 'Written from preview (not rendered again)',
+            'from_preview': True
+        }
+        remember(kind, result)
+        return result
+
+    # NFO goes inside the folder - pass movie info for enhanced NFO
+    nfo_path = torrent_folder / f"{video_name}.nfo"
+    with stage_timer('nfo'):
+        results['nfo'] = reuse('nfo') or from_preview('nfo', nfo_path)
+        if results['nfo'] is None:
+            nfo_extra_info = {
+                'release_name': video_name,
+                'original_filename': video_file.name,
+                'radarr_movie': radarr_movie,
+                'folder_name': str(torrent_folder)
             }
+            results['nfo'] = generate_nfo(
+                video_path_for_processing,  # Use renamed file
+                str(nfo_path),
+                CONFIG['NFO_TEMPLATE'],
+                extra_info=nfo_extra_info
+            )
+            remember('nfo', results['nfo'])
 
-        # Torrent goes inside the folder - based on renamed file
-        torrent_path = torrent_folder / f"{video_name}.torrent"
-        results['torrent'] = create_torrent(
-            video_path_for_processing,  # Use renamed file
-            str(torrent_path),
-            tracker_url,
-            piece_size,
-            private
-        )
+    # Generate BBCode description file
+    with stage_timer('bbcode'):
+        bbcode_path = torrent_folder / f"{video_name}_description.txt"
+        results['bbcode'] = reuse('bbcode') or from_preview('bbcode', bbcode_path)
+        if results['bbcode'] is None:
+            bbcode_content = generate_bbcode_description(
+                video_path_for_processing,
+                radarr_movie=radarr_movie,
+                release_name=video_name
+            )
+
+            if bbcode_content:
+                results['bbcode'] = save_bbcode_file(bbcode_content, str(bbcode_path))
+                remember('bbcode', results['bbcode'])
+            else:
+                results['bbcode'] = {
+                    'success': False,
+                    'message': 'Failed to generate BBCode description'
+                }
+
+    # Torrent goes inside the folder - based on renamed file
+    torrent_path = torrent_folder / f"{video_name}.torrent"
+    with stage_timer('torrent'):
+        results['torrent'] = reuse('torrent')
+        if results['torrent'] is None:
+            results['torrent'] = create_torrent(
+                video_path_for_processing,  # Use renamed file
+                str(torrent_path),
+                tracker_url,
+                piece_size,
+                private,
+                checksums=checksums,
+                progress=progress_logger('Hashing', video_name)
+            )
+            remember('torrent', results['torrent'])
+        if results['torrent'].get('success'):
+            duplicates.record(source_key, results['torrent']['path'], video_name)
+
+    results['manifest'] = {
+        'reused': reused,
+        'regenerated': regenerated,
+        'unchanged': not regenerated and len(reused) == len(input_keys)
+    }
 
-        # Additional hardlink to HARDLINK_PATH (separate location) if requested
+    # Additional hardlink to HARDLINK_PATH (separate location) if requested
+    with stage_timer('hardlink'):
         if create_link:
             hardlink_path = Path(CONFIG['HARDLINK_PATH']) / f"{video_name}{video_file.suffix}"
-            
+        
             if hardlink_path.exists():
                 results['hardlink'] = {
                     'success': True,
@@ -253,31 +703,56 @@ def create():
                 }
             else:
                 results['hardlink'] = create_hardlink(str(video_file), str(hardlink_path))
+            
+            if results['hardlink'].get('success'):
+                metrics.LINK_METHODS.inc(
+                    destination='hardlink_path',
+                    method=results['hardlink'].get('method', 'skipped')
+                )
 
-        # Check if critical operations succeeded (NFO and Torrent)
-        critical_success = (
-            results.get('nfo', {}).get('success', False) and
-            results.get('torrent', {}).get('success', False)
-        )
-        
-        # Send Discord notification
-        if CONFIG['DISCORD_WEBHOOK_URL'] and critical_success:
+    # Check if critical operations succeeded (NFO and Torrent)
+    critical_success = (
+        results.get('nfo', {}).get('success', False) and
+        results.get('torrent', {}).get('success', False)
+    )
+    
+    # Send Discord notification (nothing new to announce on a no-op rerun)
+    with stage_timer('notify'):
+        if CONFIG['DISCORD_WEBHOOK_URL'] and critical_success and not results['manifest']['unchanged']:
             send_discord_notification(
                 CONFIG['DISCORD_WEBHOOK_URL'],
                 video_name,
                 {'success': critical_success, **results}
             )
-        
-        return jsonify({
-            'success': critical_success,
-            'results': results
-        }), (200 if critical_success else 500)
+    
+    return {
+        'success': critical_success,
+        'results': results
+    }, (200 if critical_success else 500)
+
+
+@app.route('/rerender', methods=['POST'])
+def rerender_outputs():
+    """Re-render descriptions and NFOs of every processed release from cached data"""
+    try:
+        data = request.get_json(silent=True) or {}
+        kinds = tuple(data.get('kinds', rerender.KINDS))
+        if not kinds or any(kind not in rerender.KINDS for kind in kinds):
+            return jsonify({'error': f"kinds must be among {', '.join(rerender.KINDS)}"}), 400
+
+        summary = rerender.rerender_all(
+            kinds=kinds,
+            nfo_template=CONFIG['NFO_TEMPLATE'],
+            dry_run=bool(data.get('dry_run', False))
+        )
+        if summary is None:
+            return jsonify({'error': 'A re-render is already running'}), 409
+        return jsonify(summary)
 
     except Exception as e:
-        logger.exception('Error in create')
+        logger.exception('Error in rerender')
         return jsonify({'error': str(e)}), 500
 
-
 @app.route('/config', methods=['GET'])
 def get_config():
     """Get current configuration (without sensitive data)"""
@@ -287,17 +762,27 @@ def get_config():
         'HARDLINK_PATH': CONFIG['HARDLINK_PATH'],
         'TRACKER_URL': CONFIG['TRACKER_URL'],
         'PIECE_SIZE': CONFIG['PIECE_SIZE'],
+        'CHECKSUMS': CONFIG['CHECKSUMS'],
+        'REJECT_DUPLICATES': CONFIG['REJECT_DUPLICATES'],
         'PRIVATE_TORRENT': CONFIG['PRIVATE_TORRENT'],
         'AUTO_HARDLINK': CONFIG['AUTO_HARDLINK'],
         'NFO_TEMPLATE': CONFIG['NFO_TEMPLATE'],
         'USE_RADARR_NAMES': CONFIG['USE_RADARR_NAMES'],
         'RADARR_ENABLED': bool(CONFIG['RADARR_URL'] and CONFIG['RADARR_API_KEY']),
         'DISCORD_ENABLED': bool(CONFIG['DISCORD_WEBHOOK_URL']),
-        'TMDB_ENABLED': bool(CONFIG['TMDB_API_KEY'])
+        'TMDB_ENABLED': bool(CONFIG['TMDB_API_KEY']),
+        'HASH_WORKER_ENABLED': remote_worker.enabled()
     }
     return jsonify(safe_config)
 
-if __name__ == '__main__':
+def create_app():
+    """
+    Application factory used by WSGI servers (see wsgi.py / gunicorn.conf.py)
+    and by the development server below.
+
+    Caches live in SQLite under CONFIG_PATH, so every worker process shares
+    the Radarr index, TMDb responses, mediainfo probes and piece hashes.
+    """
     # Ensure all directories exist
     for p in [CONFIG['MEDIA_PATH'], CONFIG['TORRENT_PATH'], CONFIG['NFO_PATH'], 
               CONFIG['HARDLINK_PATH'], CONFIG['CONFIG_PATH']]:
@@ -306,6 +791,15 @@ if __name__ == '__main__':
         except Exception as e:
             logger.warning(f"Could not create directory {p}: {e}")
     
+    metrics.start_exporter(os.path.join(CONFIG['CONFIG_PATH'], 'metrics'))
+    library_index.start_background_indexer(CONFIG['MEDIA_PATH'], VIDEO_EXTS)
+    # Sends notifications queued by /create, including any left from a previous run
+    start_outbox_worker()
+    # Radarr index and sourceTitles before the first /create, see /ready
+    warmup.start_warmup()
+    # Idle-time hashing of unprocessed files (PREHASH_ENABLED)
+    prehash.start_prehasher(CONFIG['PIECE_SIZE'])
+    
     # Log configuration
     logger.info("=" * 60)
     logger.info("Torrentify - Configuration")
@@ -318,4 +812,9 @@ if __name__ == '__main__':
     logger.info(f"Discord Notifications: {'Enabled' if CONFIG['DISCORD_WEBHOOK_URL'] else 'Disabled'}")
     logger.info("=" * 60)
     
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    return app
+
+if __name__ == '__main__':
+    # Development server; production uses: gunicorn -c gunicorn.conf.py wsgi:app
+    metrics.reset_exports(os.path.join(CONFIG['CONFIG_PATH'], 'metrics'))
+    create_app().run(host='0.0.0.0', port=5000, debug=False, threaded=True)
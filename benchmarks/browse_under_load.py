@@ -0,0 +1,139 @@
+"""
+Load test: /browse latency while /create jobs are running.
+
+Start the server (e.g. `gunicorn -c gunicorn.conf.py wsgi:app`), then:
+
+    python benchmarks/browse_under_load.py --url http://localhost:5000 \
+        --browse-path /media --video /media/a.mkv --video /media/b.mkv
+
+Prints a JSON report with /browse latency percentiles with no load and
+while the given videos are being processed by concurrent /create calls,
+with the number of failed calls next to each set of samples.
+Piece hashes are cached, so only the first pass over each video hashes it:
+use fresh files (or a fresh CONFIG_PATH) to measure full hashing load.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'count': len(ordered),
+        'p50_ms': round(pick(0.50) * 1000, 2),
+        'p95_ms': round(pick(0.95) * 1000, 2),
+        'p99_ms': round(pick(0.99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2)
+    }
+
+
+def browse_loop(url, path, stop, samples, errors):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = session.get(f"{url}/browse", params={'path': path}, timeout=60)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            # Keep the client running, failed calls are reported separately
+            errors.append(str(e))
+            stop.wait(0.1)
+            continue
+        samples.append(time.perf_counter() - start)
+
+
+def create_loop(url, video, tracker_url, payload, stop, durations, errors):
+    session = requests.Session()
+    count = 0
+    while not stop.is_set():
+        # A new tracker per call, so the manifest cannot turn /create into a no-op
+        count += 1
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{url}/create", json={'video_path': video, 'tracker_url': f"{tracker_url}-{count}",
+                                                           **payload}, timeout=3600)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            errors.append(str(e))
+            stop.wait(0.1)
+            continue
+        durations.append(time.perf_counter() - start)
+
+
+def measure_browse(url, path, duration, clients):
+    """/browse latencies and error messages over `duration` seconds"""
+    samples = []
+    errors = []
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=browse_loop, args=(url, path, stop, samples, errors), daemon=True)
+        for _ in range(clients)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return samples, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--browse-path', required=True)
+    parser.add_argument('--video', action='append', required=True,
+                        help='video to run /create on (repeatable)')
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help='seconds per phase')
+    parser.add_argument('--browse-clients', type=int, default=4)
+    parser.add_argument('--tracker-url', default='http://tracker.invalid/announce')
+    args = parser.parse_args()
+
+    baseline, baseline_errors = measure_browse(args.url, args.browse_path, args.duration, args.browse_clients)
+
+    stop = threading.Event()
+    create_durations = []
+    create_errors = []
+    creators = [
+        threading.Thread(
+            target=create_loop,
+            args=(args.url, video, f"{args.tracker_url}?n={i}", {'create_hardlink': False},
+                  stop, create_durations, create_errors),
+            daemon=True
+        )
+        for i, video in enumerate(args.video)
+    ]
+    for t in creators:
+        t.start()
+    loaded, loaded_errors = measure_browse(args.url, args.browse_path, args.duration, args.browse_clients)
+    stop.set()
+    for t in creators:
+        t.join()
+
+    report = {
+        'browse_idle': dict(percentiles(baseline), errors=len(baseline_errors)),
+        'browse_under_create_load': dict(percentiles(loaded), errors=len(loaded_errors)),
+        'create_jobs': dict(percentiles(create_durations), errors=len(create_errors)),
+    }
+    if baseline and loaded:
+        report['p95_ratio'] = round(
+            report['browse_under_create_load']['p95_ms'] / max(report['browse_idle']['p95_ms'], 0.001), 2
+        )
+    for error in sorted(set(baseline_errors + loaded_errors + create_errors))[:5]:
+        print(f"error: {error}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Synthetic media fixtures for the benchmark suite"""
+import os
+import shutil
+from pathlib import Path
+
+
+def sparse_video(path, size):
+    """
+    A file of `size` bytes that takes no disk space. Reads are served from
+    zero pages, so hashing it measures CPU/hash throughput, not the disk.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    return path
+
+
+def real_data_video(path, size, source=None, chunk=8 * 1024 * 1024):
+    """
+    A file of `size` bytes of real data: a copy of `source` (e.g. an actual
+    video, so mediainfo has something to parse) repeated/truncated to size,
+    or random bytes when no source is given. Raises ValueError if `source`
+    is empty.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if source:
+        if os.path.getsize(source) == 0:
+            raise ValueError(f"{source} is empty, cannot build real data from it")
+        with open(source, 'rb') as src, open(path, 'wb') as dst:
+            written = 0
+            while written < size:
+                block = src.read(min(chunk, size - written))
+                if not block:
+                    src.seek(0)
+                    continue
+                dst.write(block)
+                written += len(block)
+    else:
+        with open(path, 'wb') as dst:
+            written = 0
+            while written < size:
+                block = os.urandom(min(chunk, size - written))
+                dst.write(block)
+                written += len(block)
+    return path
+
+
+def wide_directory(path, entries, video_ratio=0.9, subdirs=50):
+    """
+    A directory with `entries` children: mostly empty .mkv files, some
+    non-video files and `subdirs` sub-directories, like a large movie folder.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for i in range(subdirs):
+        (path / f"Collection {i:04d}").mkdir(exist_ok=True)
+    files = max(0, entries - subdirs)
+    videos = int(files * video_ratio)
+    for i in range(files):
+        name = f"Movie.{i:05d}.2020.1080p.BluRay.x264-GRP.mkv" if i < videos else f"extra.{i:05d}.srt"
+        (path / name).touch()
+    return path
+
+
+def clean(path):
+    shutil.rmtree(path, ignore_errors=True)
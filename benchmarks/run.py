@@ -0,0 +1,304 @@
+"""
+End-to-end benchmark of /create and /browse against local stand-ins.
+
+Starts stub Radarr/TMDb/Discord servers, generates media fixtures, runs the
+app under gunicorn with all paths in a scratch directory, and measures:
+
+- /create latency per fixture: cold, repeated (no-op) and with another
+  tracker (piece hashes reused)
+- hashing throughput (MB/s) from the server's own metrics
+- /browse latency on a wide directory (10k entries by default)
+- server memory (current and peak RSS of the gunicorn processes)
+
+Usage (from the repository root, with mediainfo and mktorrent on PATH):
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json
+
+Results are JSON, so runs can be archived and compared.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from benchmarks import fixtures, stubs
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_size(value):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    match = re.fullmatch(r'(\d+)([KMG]?)', value.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {value}")
+    return int(match.group(1)) * units.get(match.group(2), 1)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'count': len(ordered),
+        'p50_ms': round(pick(0.50) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3)
+    }
+
+
+def scrape(url):
+    """Parse the subset of /metrics the benchmark reads"""
+    values = {}
+    for line in requests.get(f"{url}/metrics", timeout=30).text.splitlines():
+        if line.startswith('#') or not line.strip():
+            continue
+        name, _, value = line.rpartition(' ')
+        values[name] = float(value)
+    return values
+
+
+def process_memory(root_pid):
+    """Current and peak RSS (KiB) of a process and its children (Linux)"""
+    pids = [root_pid]
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = Path(f"/proc/{entry}/stat").read_text()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        if ppid == root_pid:
+            pids.append(int(entry))
+
+    result = {'rss_kib': 0, 'peak_rss_kib': 0, 'processes': len(pids)}
+    for pid in pids:
+        try:
+            status = Path(f"/proc/{pid}/status").read_text()
+        except OSError:
+            continue
+        for key, field in (('VmRSS', 'rss_kib'), ('VmHWM', 'peak_rss_kib')):
+            match = re.search(rf'^{key}:\s+(\d+)', status, re.M)
+            if match:
+                result[field] += int(match.group(1))
+    return result
+
+
+def start_server(env, port, workers, threads):
+    cmd = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '-b', f"127.0.0.1:{port}", '--workers', str(workers), '--threads', str(threads),
+        'wsgi:app'
+    ]
+    log = open(Path(env['CONFIG_PATH']) / 'server.log', 'w')
+    proc = subprocess.Popen(cmd, cwd=str(REPO_ROOT), env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited early, see {log.name}")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('Server did not become healthy')
+
+
+def timed_create(url, video, **options):
+    start = time.perf_counter()
+    response = requests.post(f"{url}/create", json={'video_path': str(video), **options}, timeout=7200)
+    elapsed = time.perf_counter() - start
+    body = response.json()
+    return {
+        'seconds': round(elapsed, 4),
+        'status': response.status_code,
+        'reused': body.get('results', {}).get('manifest', {}).get('reused', []),
+        'piece_cache': body.get('results', {}).get('torrent', {}).get('piece_cache')
+    }
+
+
+def bench_create(url, name, video):
+    before = scrape(url)
+    cold = timed_create(url, video, tracker_url='http://tracker.invalid/a')
+    after = scrape(url)
+
+    hashed = after.get('torrentify_hashed_bytes_total', 0) - before.get('torrentify_hashed_bytes_total', 0)
+    hash_seconds = (after.get('torrentify_hash_duration_seconds_sum', 0)
+                    - before.get('torrentify_hash_duration_seconds_sum', 0))
+
+    return {
+        'fixture': name,
+        'size_bytes': os.path.getsize(video),
+        'cold': cold,
+        'repeat': timed_create(url, video, tracker_url='http://tracker.invalid/a'),
+        'other_tracker': timed_create(url, video, tracker_url='http://tracker.invalid/b'),
+        'hash_mb_per_s': round(hashed / hash_seconds / 1024 ** 2, 2) if hash_seconds else None
+    }
+
+
+def bench_browse(url, path, iterations):
+    session = requests.Session()
+    samples = []
+    payload_bytes = 0
+    first = None
+    for i in range(iterations):
+        start = time.perf_counter()
+        response = session.get(f"{url}/browse", params={'path': str(path)}, timeout=120)
+        elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        payload_bytes = len(response.content)
+        if i == 0:
+            first = elapsed
+        else:
+            samples.append(elapsed)
+    return {
+        'entries': sum(1 for _ in os.scandir(path)),
+        'first_ms': round(first * 1000, 3),
+        'repeat': percentiles(samples) if samples else None,
+        'response_bytes': payload_bytes
+    }
+
+
+def compare(current, baseline):
+    """Print relative changes of the headline numbers"""
+    def headline(report):
+        numbers = {}
+        for item in report['results']['create']:
+            for phase in ('cold', 'repeat', 'other_tracker'):
+                numbers[f"create.{item['fixture']}.{phase}_s"] = item[phase]['seconds']
+            if item['hash_mb_per_s']:
+                numbers[f"create.{item['fixture']}.hash_mb_per_s"] = item['hash_mb_per_s']
+        browse = report['results']['browse']
+        numbers['browse.first_ms'] = browse['first_ms']
+        if browse['repeat']:
+            numbers['browse.p95_ms'] = browse['repeat']['p95_ms']
+        numbers['memory.peak_rss_kib'] = report['results']['memory']['peak_rss_kib']
+        return numbers
+
+    new, old = headline(current), headline(baseline)
+    for key in sorted(new):
+        if key in old and old[key]:
+            change = (new[key] - old[key]) / old[key] * 100
+            print(f"{key:45} {old[key]:>12} -> {new[key]:>12}  ({change:+.1f}%)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end /create and /browse benchmark')
+    parser.add_argument('--workdir', help='scratch directory (default: a temp dir, removed afterwards)')
+    parser.add_argument('--sparse-size', type=parse_size, default=parse_size('2G'))
+    parser.add_argument('--real-size', type=parse_size, default=parse_size('256M'))
+    parser.add_argument('--real-source', help='real video to build the real-data fixture from')
+    parser.add_argument('--library-size', type=int, default=5000, help='movies in the stub Radarr')
+    parser.add_argument('--latency-ms', type=float, default=50, help='stub service latency')
+    parser.add_argument('--browse-entries', type=int, default=10000)
+    parser.add_argument('--browse-iterations', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--output', help='write JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    args = parser.parse_args()
+
+    for tool in ('mediainfo', 'mktorrent'):
+        if not shutil.which(tool):
+            parser.error(f"{tool} not found on PATH")
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='torrentify-bench-'))
+    paths = {name: workdir / name for name in ('media', 'torrents', 'hardlinks', 'config', 'nfo')}
+    for p in paths.values():
+        p.mkdir(parents=True, exist_ok=True)
+
+    videos = {
+        'sparse': fixtures.sparse_video(paths['media'] / 'sparse' / 'Sparse.Movie.2020.mkv', args.sparse_size),
+        'real': fixtures.real_data_video(paths['media'] / 'real' / 'Real.Movie.2021.mkv', args.real_size,
+                                         source=args.real_source),
+    }
+    wide = fixtures.wide_directory(paths['media'] / 'wide', args.browse_entries)
+
+    latency = args.latency_ms / 1000
+    radarr = stubs.radarr_server(args.library_size, list(videos.values()), latency).start()
+    tmdb = stubs.tmdb_server(latency).start()
+    discord = stubs.discord_server(latency).start()
+
+    env = dict(os.environ)
+    env.update({
+        'MEDIA_PATH': str(paths['media']),
+        'TORRENT_PATH': str(paths['torrents']),
+        'HARDLINK_PATH': str(paths['hardlinks']),
+        'CONFIG_PATH': str(paths['config']),
+        'NFO_PATH': str(paths['nfo']),
+        'RADARR_URL': radarr.url,
+        'RADARR_API_KEY': 'benchmark',
+        'USE_RADARR_NAMES': 'true',
+        'TMDB_API_KEY': 'benchmark',
+        'TMDB_API_URL': f"{tmdb.url}/3",
+        'DISCORD_WEBHOOK_URL': f"{discord.url}/api/webhooks/bench",
+    })
+
+    server = None
+    try:
+        server, url = start_server(env, free_port(), args.workers, args.threads)
+        results = {
+            'create': [bench_create(url, name, video) for name, video in videos.items()],
+            'browse': bench_browse(url, wide, args.browse_iterations),
+        }
+        results['memory'] = process_memory(server.pid)
+        results['stub_requests'] = {
+            'radarr': radarr.requests, 'tmdb': tmdb.requests, 'discord': discord.requests
+        }
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+        for stub in (radarr, tmdb, discord):
+            stub.stop()
+        if not args.workdir:
+            fixtures.clean(workdir)
+
+    git_rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(REPO_ROOT),
+                             capture_output=True, text=True).stdout.strip()
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_rev': git_rev,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')}
+        },
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Local stand-ins for the external services used by /create.
+
+- Radarr v3: GET /api/v3/movie, /api/v3/history/movie, /api/v3/history
+- TMDb: GET /3/movie/<id>
+- Discord: POST to any path (webhook), answered with 204
+
+Every response is delayed by a configurable latency, and the Radarr
+library size is configurable; `video_paths` are mapped onto the first
+movies so those files resolve to a Radarr movie and sourceTitle.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def build_library(size, video_paths=()):
+    """Radarr /movie payload with `size` movies"""
+    movies = []
+    for i in range(size):
+        movie_id = i + 1
+        path = str(video_paths[i]) if i < len(video_paths) else f"/movies/Movie {movie_id} (2000)/movie.{movie_id}.mkv"
+        movies.append({
+            'id': movie_id,
+            'title': f"Benchmark Movie {movie_id}",
+            'originalTitle': f"Benchmark Movie {movie_id}",
+            'year': 2000 + i % 25,
+            'tmdbId': 100000 + movie_id,
+            'imdbId': f"tt{1000000 + movie_id}",
+            'runtime': 120,
+            'overview': 'Synthetic movie used by the benchmark suite. ' * 4,
+            'genres': ['Action', 'Drama'],
+            'images': [{'coverType': 'poster', 'remoteUrl': f"https://img.invalid/{movie_id}.jpg"}],
+            'hasFile': True,
+            'movieFile': {
+                'path': path,
+                'edition': '',
+                'quality': {'quality': {'name': 'Bluray-1080p'}}
+            }
+        })
+    return movies
+
+
+def build_history(movies):
+    return [
+        {
+            'movieId': m['id'],
+            'eventType': 'grabbed',
+            'date': '2024-01-01T00:00:00Z',
+            'sourceTitle': f"Benchmark.Movie.{m['id']}.{m['year']}.1080p.BluRay.x264-BENCH"
+        }
+        for m in movies
+    ]
+
+
+def tmdb_movie(tmdb_id):
+    return {
+        'id': tmdb_id,
+        'tagline': 'A synthetic tagline',
+        'release_date': '2001-02-03',
+        'production_countries': [{'name': 'France'}],
+        'vote_average': 7.3,
+        'vote_count': 1234,
+        'credits': {
+            'crew': [{'name': 'Jane Director', 'job': 'Director'}],
+            'cast': [{'name': f"Actor {n}", 'profile_path': f"/p{n}.jpg"} for n in range(8)]
+        },
+        'videos': {'results': [{'site': 'YouTube', 'type': 'Trailer', 'key': 'dQw4w9WgXcQ'}]}
+    }
+
+
+class StubServer:
+    """Threaded HTTP server running in the background"""
+
+    def __init__(self, handler_factory, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler_factory(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _handler(stub, routes):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload=None):
+            body = json.dumps(payload).encode() if payload is not None else b''
+            self.send_response(status)
+            if body:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _dispatch(self, method):
+            stub.count()
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            for route_method, pattern, fn in routes:
+                match = re.fullmatch(pattern, url.path)
+                if route_method == method and match:
+                    status, payload = fn(match, query, body)
+                    return self._send(status, payload)
+            self._send(404, {'error': 'not found'})
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+    return Handler
+
+
+def radarr_server(library_size, video_paths=(), latency=0.0):
+    movies = build_library(library_size, video_paths)
+    history = build_history(movies)
+    by_movie = {}
+    for event in history:
+        by_movie.setdefault(event['movieId'], []).append(event)
+
+    def movie_list(match, query, body):
+        return 200, movies
+
+    def movie_history(match, query, body):
+        return 200, by_movie.get(int(query.get('movieId', 0)), [])
+
+    def paged_history(match, query, body):
+        page = int(query.get('page', 1))
+        page_size = int(query.get('pageSize', 50))
+        start = (page - 1) * page_size
+        return 200, {
+            'page': page,
+            'pageSize': page_size,
+            'totalRecords': len(history),
+            'records': history[start:start + page_size]
+        }
+
+    routes = [
+        ('GET', r'/api/v3/movie', movie_list),
+        ('GET', r'/api/v3/history/movie', movie_history),
+        ('GET', r'/api/v3/history', paged_history),
+    ]
+    return StubServer(lambda stub: _handler(stub, routes), latency)
+
+
+def tmdb_server(latency=0.0):
+    routes = [
+        ('GET', r'/3/movie/(\d+)', lambda m, q, b: (200, tmdb_movie(int(m.group(1))))),
+    ]
+    return StubServer(lambda stub: _handler(stub, routes), latency)
+
+
+def discord_server(latency=0.0):
+    routes = [
+        ('POST', r'/.*', lambda m, q, b: (204, None)),
+    ]
+    return StubServer(lambda stub: _handler(stub, routes), latency)
@@ -0,0 +1,20 @@
+import os
+
+# Several processes with a pool of threads each: a long /create holds one
+# thread while /browse keeps being served by the others. Caches are shared
+# between processes through SQLite under CONFIG_PATH.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'gthread'
+workers = int(os.getenv('WORKERS', '2'))
+threads = int(os.getenv('THREADS', '8'))
+
+# gthread workers heartbeat from their main loop, so long-running /create
+# requests are not killed by this timeout
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+graceful_timeout = 30
+
+
+def on_starting(server):
+    """Drop per-worker metric exports left over from a previous run"""
+    from utils import metrics
+    metrics.reset_exports(os.path.join(os.getenv('CONFIG_PATH', '/config'), 'metrics'))
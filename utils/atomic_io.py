@@ -0,0 +1,46 @@
+import os
+import logging
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def _temp_name(target):
+    """Unused temporary path next to target (same filesystem, so rename is atomic)"""
+    target = Path(target)
+    fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", suffix='.tmp', dir=str(target.parent))
+    os.close(fd)
+    os.unlink(tmp)
+    return tmp
+
+
+@contextmanager
+def atomic_output(target):
+    """
+    Yield a temporary path to write target through.
+
+    The temp path does not exist yet, so tools that refuse to overwrite
+    (mktorrent, os.link) can create it. On success it is renamed over
+    target; on error it is removed and target is left untouched.
+    """
+    tmp = _temp_name(target)
+    try:
+        yield tmp
+        os.replace(tmp, str(target))
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_text(target, content, encoding='utf-8'):
+    """Write a text file so readers only ever see the old or the new content"""
+    with atomic_output(target) as tmp:
+        with open(tmp, 'w', encoding=encoding) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
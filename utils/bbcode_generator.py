@@ -1,15 +1,32 @@
 import logging
+import os
 from pathlib import Path
-import subprocess
 import json
 import re
 from datetime import datetime
 
+from utils.atomic_io import atomic_write_text
+from utils.media_probe import run_mediainfo
+from utils import metrics, shared_cache
+
 logger = logging.getLogger(__name__)
 
 
-def get_tmdb_data(tmdb_id):
-    """Fetch additional data from TMDb API"""
+TMDB_CACHE_TTL = 24 * 3600
+
+# Overridable so tests/benchmarks can point at a local stand-in
+TMDB_API_URL = os.getenv('TMDB_API_URL', 'https://api.themoviedb.org/3').rstrip('/')
+
+
+def get_tmdb_data(tmdb_id, stale_ok=False):
+    """
+    Fetch additional data from TMDb API (cached across workers for a day;
+    stale_ok also accepts an older cached response)
+    """
+    cached = shared_cache.get('tmdb', f"{tmdb_id}:fr-FR", stale_ok=stale_ok)
+    if cached is not None:
+        return cached
+    
     try:
         import requests
         
@@ -22,16 +39,19 @@ def get_tmdb_data(tmdb_id):
             return None
         
         # Get movie details
-        url = f"https://api.themoviedb.org/3/movie/{tmdb_id}"
+        url = f"{TMDB_API_URL}/movie/{tmdb_id}"
         params = {
             'api_key': tmdb_api_key,
             'language': 'fr-FR',
             'append_to_response': 'credits,release_dates,videos'
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        with metrics.http_call('tmdb', 'movie'):
+            response = requests.get(url, params=params, timeout=10)
+            response.raise_for_status()
+        data = response.json()
+        shared_cache.put('tmdb', f"{tmdb_id}:fr-FR", data, ttl=TMDB_CACHE_TTL)
+        return data
         
     except Exception as e:
         logger.error(f"Error fetching TMDb data: {e}")
@@ -64,17 +84,18 @@ def get_country_flag(country_code):
     return flags.get(country_code.lower(), '🌐')
 
 
-def generate_bbcode_description(video_path, radarr_movie=None, release_name=None):
+def generate_bbcode_description(video_path, radarr_movie=None, release_name=None, stale_ok=False):
     """
     Generate BBCode description matching the FicheGen format
+
+    stale_ok lets bulk re-renders use expired TMDb cache entries instead
+    of refetching them.
     """
     try:
         video_file = Path(video_path)
         
         # Get MediaInfo data
-        cmd = ['mediainfo', '--Output=JSON', str(video_path)]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        media_data = json.loads(result.stdout)
+        media_data = json.loads(run_mediainfo(video_path, 'json'))
         
         tracks = media_data.get('media', {}).get('track', [])
         general_track = next((t for t in tracks if t.get('@type') == 'General'), {})
@@ -85,7 +106,7 @@ def generate_bbcode_description(video_path, radarr_movie=None, release_name=None
         # Get TMDb data if available
         tmdb_data = None
         if radarr_movie and radarr_movie.get('tmdbId'):
-            tmdb_data = get_tmdb_data(radarr_movie.get('tmdbId'))
+            tmdb_data = get_tmdb_data(radarr_movie.get('tmdbId'), stale_ok=stale_ok)
         
         # Build BBCode
         bbcode = ""
@@ -321,8 +342,7 @@ def generate_bbcode_description(video_path, radarr_movie=None, release_name=None
 def save_bbcode_file(bbcode_content, output_path):
     """Save BBCode content to text file"""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(bbcode_content)
+        atomic_write_text(output_path, bbcode_content)
         
         logger.info(f"BBCode file created: {output_path}")
         return {
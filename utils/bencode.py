@@ -0,0 +1,54 @@
+def encode(value):
+    """Bencode ints, str/bytes, lists and dicts (keys sorted as the spec requires)"""
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b'i%de' % value
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray)):
+        return b'%d:%s' % (len(value), bytes(value))
+    if isinstance(value, (list, tuple)):
+        return b'l' + b''.join(encode(v) for v in value) + b'e'
+    if isinstance(value, dict):
+        items = sorted(
+            (k.encode('utf-8') if isinstance(k, str) else k, v)
+            for k, v in value.items()
+        )
+        return b'd' + b''.join(encode(k) + encode(v) for k, v in items) + b'e'
+    raise TypeError(f"Cannot bencode {type(value).__name__}")
+
+
+def decode(data):
+    """Decode bencoded bytes; dict keys are returned as str, strings as bytes"""
+    value, end = _decode(data, 0)
+    if end != len(data):
+        raise ValueError('Trailing data after bencoded value')
+    return value
+
+
+def _decode(data, i):
+    c = data[i:i + 1]
+    if c == b'i':
+        end = data.index(b'e', i)
+        return int(data[i + 1:end]), end + 1
+    if c == b'l':
+        i += 1
+        items = []
+        while data[i:i + 1] != b'e':
+            item, i = _decode(data, i)
+            items.append(item)
+        return items, i + 1
+    if c == b'd':
+        i += 1
+        result = {}
+        while data[i:i + 1] != b'e':
+            key, i = _decode(data, i)
+            result[key.decode('utf-8')], i = _decode(data, i)
+        return result, i + 1
+    if c.isdigit():
+        colon = data.index(b':', i)
+        length = int(data[i:colon])
+        start = colon + 1
+        return data[start:start + length], start + length
+    raise ValueError(f"Invalid bencode at offset {i}")
@@ -0,0 +1,187 @@
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+from utils import metrics, timeline
+
+logger = logging.getLogger(__name__)
+
+# ioctl(dest, FICLONE, src): share all extents of src (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+COPY_CHUNK = 64 * 1024 * 1024
+# Progress is made durable (fsync + checkpoint) about every this many bytes
+CHECKPOINT_BYTES = int(os.getenv('COPY_CHECKPOINT_MB', '1024')) * 1024 * 1024
+
+# Errors meaning "this method is not available here", so the next one is tried
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOSYS,
+    errno.ENOTTY, errno.EBADF, errno.EPERM
+}
+
+
+def _partial_paths(target):
+    target = Path(target)
+    partial = target.parent / f".{target.name}.partial"
+    return partial, partial.with_name(partial.name + '.json')
+
+
+def _source_key(st):
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _resume_offset(partial, checkpoint, source_key):
+    """Bytes of a previous interrupted copy of the same source that are safe to keep"""
+    try:
+        state = json.loads(checkpoint.read_text())
+        if state.get('source') != source_key:
+            return 0
+        return min(int(state.get('offset', 0)), partial.stat().st_size)
+    except (OSError, ValueError):
+        return 0
+
+
+def _reflink(src_fd, dst_fd):
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _kernel_copy(copy_fn, src_fd, dst_fd, offset, total, on_chunk):
+    """Copy [offset, total) with copy_file_range or sendfile, chunk by chunk"""
+    while offset < total:
+        count = min(COPY_CHUNK, total - offset)
+        if copy_fn is os.sendfile:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            sent = os.sendfile(dst_fd, src_fd, offset, count)
+        else:
+            sent = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        if sent == 0:
+            raise OSError(errno.EIO, f"Source ended at {offset} of {total} bytes")
+        offset += sent
+        on_chunk(offset)
+    return offset
+
+
+def _userspace_copy(src_fd, dst_fd, offset, total, on_chunk):
+    buffer = bytearray(min(COPY_CHUNK, 8 * 1024 * 1024))
+    view = memoryview(buffer)
+    while offset < total:
+        n = os.preadv(src_fd, [view[:min(len(buffer), total - offset)]], offset)
+        if n == 0:
+            raise OSError(errno.EIO, f"Source ended at {offset} of {total} bytes")
+        written = 0
+        while written < n:
+            written += os.pwrite(dst_fd, view[written:n], offset + written)
+        offset += n
+        on_chunk(offset)
+    return offset
+
+
+def copy_file(source_path, target_path, progress=None):
+    """
+    Copy a (possibly huge) file to target_path, as cheaply as the
+    filesystems allow:
+
+    1. reflink (FICLONE): instant, no extra space on CoW filesystems
+    2. copy_file_range: in-kernel, server-side on NFS, reflink on some fs
+    3. sendfile: in-kernel, no userspace buffers
+    4. pread/pwrite as a last resort
+
+    The copy goes through a hidden .partial file next to the target and is
+    checkpointed regularly, so an interrupted copy of the same source
+    resumes where it stopped. Permissions and times are copied like
+    shutil.copy2; the target appears atomically when complete.
+
+    Args:
+        source_path: File to copy
+        target_path: Destination (replaced if it exists)
+        progress: Optional callable(copied_bytes, total_bytes)
+
+    Returns:
+        dict with method, bytes (copied by this call), resumed_from and seconds
+    """
+    source = Path(source_path)
+    target = Path(target_path)
+    partial, checkpoint = _partial_paths(target)
+    start = time.monotonic()
+
+    src_fd = os.open(str(source), os.O_RDONLY)
+    try:
+        st = os.fstat(src_fd)
+        total = st.st_size
+        source_key = _source_key(st)
+
+        resumed_from = _resume_offset(partial, checkpoint, source_key)
+        dst_fd = os.open(str(partial), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(dst_fd, resumed_from)
+            last_checkpoint = [resumed_from]
+
+            def on_chunk(copied):
+                if copied - last_checkpoint[0] >= CHECKPOINT_BYTES:
+                    os.fsync(dst_fd)
+                    checkpoint.write_text(json.dumps({'source': source_key, 'offset': copied}))
+                    last_checkpoint[0] = copied
+                if progress:
+                    progress(copied, total)
+
+            method = None
+            if resumed_from == 0 and total > 0:
+                try:
+                    _reflink(src_fd, dst_fd)
+                    method = 'reflink'
+                    if progress:
+                        progress(total, total)
+                except OSError as e:
+                    if e.errno not in UNSUPPORTED_ERRNOS:
+                        raise
+
+            if method is None:
+                offset = resumed_from
+                for name, copy_fn in (('copy_file_range', getattr(os, 'copy_file_range', None)),
+                                      ('sendfile', getattr(os, 'sendfile', None))):
+                    if copy_fn is None:
+                        continue
+                    try:
+                        offset = _kernel_copy(copy_fn, src_fd, dst_fd, offset, total, on_chunk)
+                        method = name
+                        break
+                    except OSError as e:
+                        if e.errno not in UNSUPPORTED_ERRNOS:
+                            raise
+                        logger.debug(f"{name} unavailable for {target}: {e}")
+                if method is None:
+                    _userspace_copy(src_fd, dst_fd, offset, total, on_chunk)
+                    method = 'read_write'
+
+            os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    shutil.copystat(str(source), str(partial))
+    os.replace(str(partial), str(target))
+    try:
+        checkpoint.unlink()
+    except FileNotFoundError:
+        pass
+
+    elapsed = time.monotonic() - start
+    copied = total - resumed_from
+    metrics.COPY_BYTES.inc(copied, method=method)
+    timeline.count('bytes_copied', copied)
+    logger.info(
+        f"Copied {source} -> {target} with {method}: {copied / 1024 ** 2:.0f} MiB in {elapsed:.1f}s"
+        + (f" (resumed at {resumed_from / 1024 ** 2:.0f} MiB)" if resumed_from else '')
+    )
+    return {
+        'method': method,
+        'bytes': copied,
+        'resumed_from': resumed_from,
+        'seconds': round(elapsed, 3)
+    }
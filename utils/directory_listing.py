@@ -0,0 +1,118 @@
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Directories kept in memory per worker, and how long a listing may be
+# trusted even if the directory mtime did not change (some FUSE/network
+# filesystems do not update it reliably)
+LISTING_CACHE_SIZE = int(os.getenv('LISTING_CACHE_SIZE', '64'))
+LISTING_CACHE_MAX_AGE = int(os.getenv('LISTING_CACHE_MAX_AGE', '300'))
+
+SORT_KEYS = {
+    'name': lambda item: item['name'],
+    'size': lambda item: item.get('size', -1),
+    'mtime': lambda item: item.get('mtime', 0),
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _scan(path, video_exts):
+    """
+    One scandir() pass. is_dir() comes from the directory entry type on
+    most filesystems, and stat() is only called for video files, once.
+    Directories are not stat'ed (movie libraries are mostly directories).
+    """
+    items = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    items.append({
+                        'name': entry.name,
+                        'path': entry.path,
+                        'type': 'directory'
+                    })
+                elif os.path.splitext(entry.name)[1].lower() in video_exts:
+                    st = entry.stat()
+                    items.append({
+                        'name': entry.name,
+                        'path': entry.path,
+                        'type': 'file',
+                        'size': st.st_size,
+                        'mtime': st.st_mtime
+                    })
+            except OSError as e:
+                # Broken symlink or entry removed during the scan
+                logger.debug(f"Skipping {entry.path}: {e}")
+    items.sort(key=SORT_KEYS['name'])
+    return items
+
+
+def list_directory(path, video_exts):
+    """
+    Sub-directories and video files of path, sorted by name.
+
+    Listings are cached per worker and keyed by the directory mtime, which
+    changes whenever an entry is added, removed or renamed.
+
+    Returns:
+        tuple (items, cached) - items must not be modified by the caller
+    """
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    now = time.monotonic()
+
+    with _cache_lock:
+        hit = _cache.get(path)
+        if hit and hit[0] == mtime_ns and now - hit[1] < LISTING_CACHE_MAX_AGE:
+            _cache.move_to_end(path)
+            return hit[2], True
+
+    items = _scan(path, video_exts)
+
+    with _cache_lock:
+        _cache[path] = (mtime_ns, now, items)
+        _cache.move_to_end(path)
+        while len(_cache) > LISTING_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return items, False
+
+
+def query_listing(items, query=None, item_type=None, sort='name', order='asc',
+                  offset=0, limit=None):
+    """
+    Filter, sort and paginate a listing
+
+    Args:
+        items: Listing from list_directory()
+        query: Case-insensitive substring to match against names
+        item_type: 'file' or 'directory' to keep only that type
+        sort: 'name', 'size' or 'mtime'
+        order: 'asc' or 'desc'
+        offset: Index of the first item returned
+        limit: Maximum number of items returned (None = all)
+
+    Returns:
+        tuple (page, total) where total counts all items matching the filter
+    """
+    selected = items
+    if query:
+        needle = query.lower()
+        selected = [item for item in selected if needle in item['name'].lower()]
+    if item_type:
+        selected = [item for item in selected if item['type'] == item_type]
+
+    if sort != 'name' or order == 'desc':
+        selected = sorted(selected, key=SORT_KEYS.get(sort, SORT_KEYS['name']),
+                          reverse=(order == 'desc'))
+
+    total = len(selected)
+    end = None if limit is None else offset + limit
+    return selected[offset:end], total
@@ -1,75 +1,322 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
 import requests
 import logging
 from pathlib import Path
 from datetime import datetime
 
+from utils import metrics
+
 logger = logging.getLogger(__name__)
 
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+OUTBOX_DB = os.path.join(CONFIG_PATH, 'outbox.db')
+
+# Releases completed within this window are merged into one message
+OUTBOX_BATCH_WINDOW = float(os.getenv('DISCORD_BATCH_WINDOW', '5'))
+OUTBOX_POLL_INTERVAL = 2
+MAX_ATTEMPTS = 12
+
+# Discord webhook limits per message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS discord_outbox (
+    id INTEGER PRIMARY KEY,
+    webhook_url TEXT NOT NULL,
+    embed TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+_wakeup = threading.Event()
+_worker_lock = threading.Lock()
+_worker_thread = None
+
+
+def _connect():
+    global _schema_ready
+
+    conn = sqlite3.connect(OUTBOX_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                Path(OUTBOX_DB).parent.mkdir(parents=True, exist_ok=True)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+                conn.commit()
+                _schema_ready = True
+
+    return conn
+
+
+def build_embed(video_name, results):
+    """Discord embed describing one created release"""
+    # Build status message
+    nfo_status = "✅" if results.get('nfo', {}).get('success') else "❌"
+    torrent_status = "✅" if results.get('torrent', {}).get('success') else "❌"
+    hardlink_status = "✅" if results.get('hardlink', {}).get('success') else "❌"
+
+    # Get methods/messages
+    hardlink_method = results.get('hardlink', {}).get('method', 'N/A')
+
+    return {
+        "title": "🎬 New Torrent Created",
+        "description": f"**{video_name}**",
+        "color": 0x8bc34a if results.get('success') else 0xff9800,
+        "fields": [
+            {
+                "name": f"{nfo_status} NFO File",
+                "value": results.get('nfo', {}).get('path', 'Failed')[-100:],
+                "inline": False
+            },
+            {
+                "name": f"{torrent_status} Torrent File",
+                "value": results.get('torrent', {}).get('path', 'Failed')[-100:],
+                "inline": False
+            },
+            {
+                "name": f"{hardlink_status} Hardlink/Symlink",
+                "value": f"{results.get('hardlink', {}).get('target', 'Failed')[-80:]}\n*Method: {hardlink_method}*",
+                "inline": False
+            }
+        ],
+        "footer": {
+            "text": "Torrent-nfo-creator • Automated Torrent Creator"
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def embed_chars(embed):
+    """Characters Discord counts towards the 6000 per-message limit"""
+    return (
+        len(embed.get('title', '')) + len(embed.get('description', ''))
+        + len(embed.get('footer', {}).get('text', ''))
+        + len(embed.get('author', {}).get('name', ''))
+        + sum(len(f.get('name', '')) + len(f.get('value', '')) for f in embed.get('fields', []))
+    )
+
 
 def send_discord_notification(webhook_url, video_name, results):
     """
-    Send Discord notification when torrent is created
-    
+    Queue a Discord notification for a created torrent. It is stored in
+    the outbox and delivered by the background worker, merged with other
+    releases completed at the same time.
+
     Args:
         webhook_url: Discord webhook URL
         video_name: Name of the video file
         results: Dict with nfo, torrent, hardlink results
-    
+
     Returns:
-        bool: Success status
+        bool: True if the notification was queued
     """
     if not webhook_url:
         return False
-    
+
     try:
-        # Build status message
-        nfo_status = "✅" if results.get('nfo', {}).get('success') else "❌"
-        torrent_status = "✅" if results.get('torrent', {}).get('success') else "❌"
-        hardlink_status = "✅" if results.get('hardlink', {}).get('success') else "❌"
-        
-        # Get methods/messages
-        hardlink_method = results.get('hardlink', {}).get('method', 'N/A')
-        hardlink_msg = results.get('hardlink', {}).get('message', '')
-        
-        # Create embed
-        embed = {
-            "title": "🎬 New Torrent Created",
-            "description": f"**{video_name}**",
-            "color": 0x8bc34a if results.get('success') else 0xff9800,
-            "fields": [
-                {
-                    "name": f"{nfo_status} NFO File",
-                    "value": results.get('nfo', {}).get('path', 'Failed')[-100:],
-                    "inline": False
-                },
-                {
-                    "name": f"{torrent_status} Torrent File",
-                    "value": results.get('torrent', {}).get('path', 'Failed')[-100:],
-                    "inline": False
-                },
-                {
-                    "name": f"{hardlink_status} Hardlink/Symlink",
-                    "value": f"{results.get('hardlink', {}).get('target', 'Failed')[-80:]}\n*Method: {hardlink_method}*",
-                    "inline": False
-                }
-            ],
-            "footer": {
-                "text": "Torrent-nfo-creator • Automated Torrent Creator"
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
+        now = time.time()
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT INTO discord_outbox (webhook_url, embed, created_at, next_attempt_at) '
+                'VALUES (?, ?, ?, ?)',
+                (webhook_url, json.dumps(build_embed(video_name, results)), now, now)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Failed to queue Discord notification: {e}")
+        return False
+
+    logger.info(f"Discord notification queued for: {video_name}")
+    start_outbox_worker()
+    _wakeup.set()
+    return True
+
+
+def pending_notifications():
+    """Number of notifications waiting in the outbox"""
+    try:
+        conn = _connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM discord_outbox').fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        return 0
+
+
+def _retry_after(response):
+    """Seconds to wait from a 429 (or exhausted bucket) response"""
+    delays = []
+    for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+        try:
+            delays.append(float(response.headers[header]))
+        except (KeyError, ValueError):
+            pass
+    try:
+        delays.append(float(response.json().get('retry_after')))
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return max(delays) if delays else 5.0
+
+
+class OutboxWorker:
+    """Sends queued notifications, batching them and respecting rate limits"""
+
+    def __init__(self):
+        self.paused_until = 0.0
+
+    def next_batch(self, conn, now):
+        """
+        Oldest due notifications for one webhook, within the embed limits,
+        or [] while the batch window is still open
+        """
+        rows = conn.execute(
+            'SELECT * FROM discord_outbox WHERE next_attempt_at <= ? ORDER BY id LIMIT 100',
+            (now,)
+        ).fetchall()
+        if not rows:
+            return []
+
+        webhook_url = rows[0]['webhook_url']
+        batch = []
+        chars = 0
+        for row in rows:
+            if row['webhook_url'] != webhook_url:
+                continue
+            size = embed_chars(json.loads(row['embed']))
+            if batch and (len(batch) >= MAX_EMBEDS or chars + size > MAX_EMBED_CHARS):
+                break
+            batch.append(row)
+            chars += size
+
+        # Wait for more releases unless the message is full or a retry
+        window_open = now - rows[0]['created_at'] < OUTBOX_BATCH_WINDOW
+        if window_open and len(batch) < MAX_EMBEDS and len(batch) == len(rows) and rows[0]['attempts'] == 0:
+            return []
+        return batch
+
+    def send(self, conn, batch):
+        ids = [row['id'] for row in batch]
+        placeholders = ','.join('?' * len(ids))
         payload = {
             "username": "Torrent-nfo-creator",
-            "embeds": [embed]
+            "embeds": [json.loads(row['embed']) for row in batch]
         }
-        
-        response = requests.post(webhook_url, json=payload, timeout=10)
-        response.raise_for_status()
-        
-        logger.info(f"Discord notification sent for: {video_name}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to send Discord notification: {e}")
-        return False
+
+        try:
+            with metrics.http_call('discord', 'webhook'):
+                response = requests.post(batch[0]['webhook_url'], json=payload, timeout=10)
+                if response.status_code != 429:
+                    response.raise_for_status()
+        except requests.HTTPError as e:
+            status = e.response.status_code
+            if 400 <= status < 500:
+                # Rejected payload or deleted webhook: retrying cannot help
+                logger.error(f"Discord rejected {len(ids)} notification(s), dropping: {e}")
+                conn.execute(f'DELETE FROM discord_outbox WHERE id IN ({placeholders})', ids)
+                conn.commit()
+                return
+            self.retry_later(conn, batch, str(e))
+            return
+        except Exception as e:
+            self.retry_later(conn, batch, str(e))
+            return
+
+        if response.status_code == 429:
+            delay = _retry_after(response)
+            self.paused_until = time.time() + delay
+            logger.warning(f"Discord rate limit hit, retrying {len(ids)} notification(s) in {delay:.1f}s")
+            return
+
+        conn.execute(f'DELETE FROM discord_outbox WHERE id IN ({placeholders})', ids)
+        conn.commit()
+        logger.info(f"Discord notification sent for {len(ids)} release(s)")
+
+        # Bucket exhausted: wait for it to refill instead of hitting a 429
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            self.paused_until = time.time() + _retry_after(response)
+
+    def retry_later(self, conn, batch, error):
+        now = time.time()
+        for row in batch:
+            attempts = row['attempts'] + 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on Discord notification {row['id']} after {attempts} attempts: {error}")
+                conn.execute('DELETE FROM discord_outbox WHERE id = ?', (row['id'],))
+                continue
+            conn.execute(
+                'UPDATE discord_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                (attempts, now + min(3600, 5 * 2 ** attempts), error, row['id'])
+            )
+        conn.commit()
+        logger.warning(f"Failed to send Discord notification, will retry: {error}")
+
+    def run_once(self):
+        """Send every batch that is due; returns True if anything was sent or tried"""
+        worked = False
+        conn = _connect()
+        try:
+            while time.time() >= self.paused_until:
+                batch = self.next_batch(conn, time.time())
+                if not batch:
+                    break
+                self.send(conn, batch)
+                worked = True
+        finally:
+            conn.close()
+        return worked
+
+
+def start_outbox_worker():
+    """
+    Deliver queued notifications from a daemon thread. With several worker
+    processes only the one holding the outbox lock sends; notifications
+    left over by a previous run are sent when it starts.
+    """
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None:
+            return
+
+        lock_path = os.path.join(CONFIG_PATH, 'locks', 'discord-outbox.lock')
+
+        def run():
+            worker = OutboxWorker()
+            Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+            lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            holding = False
+            while True:
+                if not holding:
+                    try:
+                        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        holding = True
+                    except BlockingIOError:
+                        pass
+                if holding:
+                    try:
+                        worker.run_once()
+                    except Exception:
+                        logger.exception('Discord outbox worker failed')
+                _wakeup.wait(OUTBOX_POLL_INTERVAL)
+                _wakeup.clear()
+
+        _worker_thread = threading.Thread(target=run, name='discord-outbox', daemon=True)
+        _worker_thread.start()
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from utils import bencode, manifest, shared_cache, timeline
+
+logger = logging.getLogger(__name__)
+
+# Chunks read at evenly spaced offsets (first and last included)
+SAMPLE_CHUNKS = 8
+SAMPLE_CHUNK_SIZE = 64 * 1024
+
+
+def sample_fingerprint(path):
+    """
+    Hash of the size and a few sampled chunks of a file: about 512 KiB
+    read instead of the whole file. Two files with the same fingerprint
+    are very likely the same encode.
+
+    Cached by inode/size/mtime.
+    """
+    key = shared_cache.file_key(path)
+    cached = shared_cache.get('sample', key)
+    if cached is not None:
+        return cached
+
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_CHUNKS * SAMPLE_CHUNK_SIZE:
+            digest.update(f.read())
+        else:
+            step = (size - SAMPLE_CHUNK_SIZE) // (SAMPLE_CHUNKS - 1)
+            for i in range(SAMPLE_CHUNKS):
+                digest.update(os.pread(f.fileno(), SAMPLE_CHUNK_SIZE, i * step))
+
+    timeline.count('bytes_sampled', min(size, SAMPLE_CHUNKS * SAMPLE_CHUNK_SIZE))
+    sample = digest.hexdigest()
+    shared_cache.put('sample', key, sample)
+    return sample
+
+
+def infohash(torrent_path):
+    """BitTorrent v1 infohash (hex) of a .torrent file"""
+    with open(torrent_path, 'rb') as f:
+        info = bencode.decode(f.read())['info']
+    return hashlib.sha1(bencode.encode(info)).hexdigest()
+
+
+def record(source_path, torrent_path, release_name):
+    """Add a processed file to the duplicate index"""
+    try:
+        manifest.record_fingerprint(
+            source_path,
+            os.path.getsize(source_path),
+            sample_fingerprint(source_path),
+            infohash(torrent_path),
+            torrent_path,
+            release_name
+        )
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {source_path}: {e}")
+
+
+def find_duplicates(source_path):
+    """
+    Processed files that are likely the same encode as source_path (same
+    size and sampled chunks, different path)
+
+    Returns:
+        list of dicts with source_path, release_name, torrent_path and infohash
+    """
+    source_path = str(Path(source_path).resolve())
+    size = os.path.getsize(source_path)
+    if not manifest.fingerprints_matching(size):
+        # No processed file of that size: nothing to sample
+        return []
+
+    matches = manifest.fingerprints_matching(size, sample_fingerprint(source_path))
+    return [
+        {
+            'source_path': match['source_path'],
+            'release_name': match['release_name'],
+            'torrent_path': match['torrent_path'],
+            'infohash': match['infohash']
+        }
+        for match in matches
+        if match['source_path'] != source_path
+    ]
+
+
+def backfill():
+    """Fingerprint processed files recorded before the index existed"""
+    added = 0
+    for source_path, torrent_path, release_name in manifest.unfingerprinted_torrents():
+        if os.path.exists(source_path) and os.path.exists(torrent_path):
+            record(source_path, torrent_path, release_name)
+            added += 1
+    if added:
+        logger.info(f"Duplicate index: {added} processed files fingerprinted")
+    return added
@@ -1,89 +1,213 @@
-import subprocess
+import errno
 import os
-import shutil
 import logging
+import threading
 from pathlib import Path
 
+from utils.atomic_io import atomic_output
+from utils.copy_engine import copy_file
+
 logger = logging.getLogger(__name__)
 
+# Roots whose device ids are cached; sources and targets live under them
+LINK_ROOTS = {
+    'MEDIA_PATH': os.getenv('MEDIA_PATH', '/media'),
+    'TORRENT_PATH': os.getenv('TORRENT_PATH', '/torrents'),
+    'HARDLINK_PATH': os.getenv('HARDLINK_PATH', '/hardlinks'),
+}
 
-def create_hardlink(source_path, target_path):
+# os.link() failures that mean "no hardlink possible here" rather than a
+# real error: other filesystem, filesystem without hardlinks (some FUSE and
+# SMB mounts, protected_hardlinks), or the inode's link limit reached
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+class DeviceMap:
+    """
+    st_dev of the paths being linked, so the linking strategy is known
+    before any link is attempted. Each source and target is stat'ed
+    itself (a bind mount or separate filesystem may sit under a root);
+    the st_dev of the configured roots, stat'ed once per process, is only
+    used when that stat fails.
+    """
+
+    def __init__(self, roots):
+        self.roots = [os.path.abspath(p) for p in roots]
+        self._devices = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        devices = {}
+        for root in self.roots:
+            try:
+                devices[root] = os.stat(root).st_dev
+            except OSError:
+                continue
+        return devices
+
+    def devices(self):
+        with self._lock:
+            if self._devices is None:
+                self._devices = self._load()
+                logger.info(f"Link device map: {self._devices}")
+            return self._devices
+
+    def refresh(self):
+        with self._lock:
+            self._devices = None
+
+    def device_of(self, path):
+        """
+        st_dev of path or of its closest existing ancestor, or of the
+        deepest configured root containing it when that stat fails
+        """
+        path = os.path.abspath(path)
+        probe = path
+        while True:
+            try:
+                return os.stat(probe).st_dev
+            except FileNotFoundError:
+                parent = os.path.dirname(probe)
+                if parent == probe:
+                    break
+                probe = parent
+            except OSError:
+                break
+
+        devices = self.devices()
+        root = max(
+            (r for r in devices if path == r or path.startswith(r.rstrip(os.sep) + os.sep)),
+            key=len, default=None
+        )
+        return devices[root] if root is not None else None
+
+    def same_device(self, source, target):
+        source_dev = self.device_of(source)
+        target_dev = self.device_of(os.path.dirname(os.path.abspath(target)))
+        if source_dev is None or target_dev is None:
+            return None
+        return source_dev == target_dev
+
+
+device_map = DeviceMap(LINK_ROOTS.values())
+
+
+def plan(source_path, target_path, fallback='copy'):
+    """Method link_file() will use: 'hardlink', or the fallback across devices"""
+    return fallback if device_map.same_device(source_path, target_path) is False else 'hardlink'
+
+
+def _fallback(source, target, fallback, progress=None):
+    """Symlink or copy source to target; returns the copy details, if any"""
+    if fallback == 'symlink':
+        with atomic_output(target) as tmp_path:
+            os.symlink(source.resolve(), tmp_path)
+        return None
+    return copy_file(source, target, progress=progress)
+
+
+def link_file(source_path, target_path, fallback='copy', progress=None):
     """
-    Create a hardlink, with fallback to symlink or copy if cross-device
-    
+    Hardlink source_path to target_path, or fall back to a symlink or copy
+    when a hardlink is not possible (decided from the device map and from
+    the os.link errno, never by spawning a process)
+
+    The link is created under a temporary name and renamed into place, so
+    a concurrent reader never sees a partial file.
+
     Args:
         source_path: Original file path
-        target_path: Hardlink/link destination path
-    
+        target_path: Destination path (must not exist)
+        fallback: 'copy' or 'symlink'
+        progress: Optional callable(copied_bytes, total_bytes) for copies
+
     Returns:
-        dict with status and message
+        dict with success, method ('hardlink', 'symlink' or 'copy') and
+        message; copies also report copy_method, bytes and resumed_from
+        (see copy_engine.copy_file)
     """
+    source = Path(source_path)
+    target = Path(target_path)
+    method = plan(source, target, fallback)
+    copy_details = None
+
     try:
-        source = Path(source_path)
-        target = Path(target_path)
-        
-        if not source.exists():
-            return {
-                'success': False,
-                'error': 'Source file does not exist'
-            }
-        
-        if target.exists():
-            return {
-                'success': True,
-                'message': 'File already exists (skipped)',
-                'target': str(target)
-            }
-        
-        # Ensure target directory exists
         target.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Method 1: Try hardlink with cp -al
-        try:
-            cmd = ['cp', '-al', str(source), str(target)]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            
-            logger.info(f"Hardlink created: {source} -> {target}")
-            return {
-                'success': True,
-                'source': str(source),
-                'target': str(target),
-                'message': 'Hardlink created successfully',
-                'method': 'hardlink'
-            }
-        
-        except subprocess.CalledProcessError as e:
-            error_msg = e.stderr.strip() if e.stderr else str(e)
-            
-            # Check if it's a cross-device error
-            if 'cross-device' in error_msg.lower() or 'Invalid cross-device link' in error_msg:
-                logger.warning(f"Cross-device detected, using symlink instead")
-                
-                # Method 2: Create symbolic link (recommended - no extra space)
-                os.symlink(source.resolve(), target)
-                logger.info(f"Symlink created: {source} -> {target}")
-                return {
-                    'success': True,
-                    'source': str(source),
-                    'target': str(target),
-                    'message': '✓ Symbolic link created (different filesystems detected)',
-                    'method': 'symlink'
-                }
-            else:
-                # Other error - try symlink anyway
-                logger.warning(f"cp -al failed, trying symlink: {error_msg}")
-                os.symlink(source.resolve(), target)
-                return {
-                    'success': True,
-                    'source': str(source),
-                    'target': str(target),
-                    'message': '✓ Symbolic link created',
-                    'method': 'symlink'
-                }
-        
+
+        if method == 'hardlink':
+            try:
+                with atomic_output(target) as tmp_path:
+                    os.link(str(source), tmp_path)
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRNOS:
+                    raise
+                if e.errno == errno.EXDEV:
+                    # Mount layout changed since the map was built
+                    device_map.refresh()
+                logger.warning(f"Hardlink not possible ({errno.errorcode.get(e.errno, e.errno)}), "
+                               f"using {fallback}: {target}")
+                method = fallback
+
+        if method != 'hardlink':
+            copy_details = _fallback(source, target, fallback, progress)
+
     except Exception as e:
-        logger.exception(f"All methods failed: {e}")
+        logger.error(f"Linking {source} -> {target} failed: {e}")
         return {
             'success': False,
+            'source': str(source),
+            'target': str(target),
             'error': str(e)
         }
+
+    logger.info(f"{method.capitalize()} created: {source} -> {target}")
+    result = {
+        'success': True,
+        'source': str(source),
+        'target': str(target),
+        'message': {
+            'hardlink': 'Hardlink created successfully',
+            'symlink': '✓ Symbolic link created (different filesystems detected)',
+            'copy': 'File copied (hardlink not possible)'
+        }[method],
+        'method': method
+    }
+    if copy_details:
+        result.update({
+            'copy_method': copy_details['method'],
+            'bytes': copy_details['bytes'],
+            'resumed_from': copy_details['resumed_from']
+        })
+        if copy_details['method'] == 'reflink':
+            result['message'] = 'File cloned (reflink, no extra space used)'
+    return result
+
+
+def create_hardlink(source_path, target_path):
+    """
+    Create a hardlink, with fallback to symlink if cross-device
+
+    Args:
+        source_path: Original file path
+        target_path: Hardlink/link destination path
+
+    Returns:
+        dict with status and message
+    """
+    source = Path(source_path)
+    target = Path(target_path)
+
+    if not source.exists():
+        return {
+            'success': False,
+            'error': 'Source file does not exist'
+        }
+
+    if target.exists():
+        return {
+            'success': True,
+            'message': 'File already exists (skipped)',
+            'target': str(target)
+        }
+
+    return link_file(source, target, fallback='symlink')
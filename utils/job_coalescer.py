@@ -0,0 +1,109 @@
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    def __init__(self, params):
+        self.params = params
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class JobCoalescer:
+    """
+    Deduplicate concurrent runs of the same job.
+
+    While a job is in flight for a key, a caller asking for the same key with
+    the same parameters waits for it and gets its result instead of starting
+    a second run. A caller with different parameters waits for the running
+    job to finish and then runs its own, so work on one key never overlaps.
+
+    With lock_dir set, runs are also serialised across worker processes
+    through a per-key flock(); a run queued behind another process's run
+    starts after it and can reuse its outputs.
+    """
+
+    def __init__(self, lock_dir=None):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._waiting = 0
+        self._lock_dir = lock_dir
+
+    def run(self, key, params, fn):
+        """
+        Run fn() for key unless an identical job is already running
+
+        Args:
+            key: Deduplication key (e.g. resolved source path)
+            params: Hashable/comparable job parameters
+            fn: Callable producing the job result
+
+        Returns:
+            tuple (result, coalesced) where coalesced is True when the result
+            was produced by another caller's run
+        """
+        while True:
+            with self._lock:
+                job = self._jobs.get(key)
+                if job is None:
+                    job = _Job(params)
+                    self._jobs[key] = job
+                    break
+                self._waiting += 1
+
+            try:
+                job.done.wait()
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if job.params == params:
+                logger.info(f"Attached to in-flight job for {key}")
+                if job.error is not None:
+                    raise job.error
+                return job.result, True
+
+        try:
+            with self._process_lock(key):
+                job.result = fn()
+            return job.result, False
+        except BaseException as e:
+            job.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._jobs[key]
+            job.done.set()
+
+    @contextmanager
+    def _process_lock(self, key):
+        if not self._lock_dir:
+            yield
+            return
+
+        Path(self._lock_dir).mkdir(parents=True, exist_ok=True)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lock'
+        fd = os.open(os.path.join(self._lock_dir, name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def in_flight(self):
+        """Number of jobs currently running"""
+        with self._lock:
+            return len(self._jobs)
+
+    def waiting(self):
+        """Number of callers blocked on a running job"""
+        with self._lock:
+            return self._waiting
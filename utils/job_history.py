@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import re
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from utils.atomic_io import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+JOBS_DIR = os.path.join(CONFIG_PATH, 'jobs')
+JOB_HISTORY_KEEP = int(os.getenv('JOB_HISTORY_KEEP', '500'))
+
+JOB_ID_RE = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+def new_job_id():
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def save(job):
+    """
+    Keep a finished /create job (parameters, results and timeline) under
+    CONFIG_PATH/jobs, so a slow release can be looked at later; only the
+    newest JOB_HISTORY_KEEP jobs are kept
+    """
+    try:
+        Path(JOBS_DIR).mkdir(parents=True, exist_ok=True)
+        atomic_write_text(os.path.join(JOBS_DIR, f"{job['id']}.json"), json.dumps(job, indent=2))
+        _prune()
+    except Exception as e:
+        logger.warning(f"Could not save job {job['id']}: {e}")
+
+
+def _prune():
+    jobs = sorted(Path(JOBS_DIR).glob('*.json'))
+    for old in jobs[:-JOB_HISTORY_KEEP] if JOB_HISTORY_KEEP > 0 else []:
+        try:
+            old.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def list_jobs(limit=100):
+    """Summaries of recorded jobs, newest first"""
+    jobs = []
+    for path in sorted(Path(JOBS_DIR).glob('*.json'), reverse=True)[:limit]:
+        try:
+            job = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        jobs.append({
+            'id': job['id'],
+            'video_path': job['video_path'],
+            'release_name': job.get('release_name'),
+            'success': job['success'],
+            'started_at': job['timeline']['started_at'],
+            'summary': job['timeline']['summary']
+        })
+    return jobs
+
+
+def get_job(job_id):
+    """A recorded job, or None if the id is invalid or unknown"""
+    if not JOB_ID_RE.match(job_id):
+        return None
+    try:
+        return json.loads(Path(JOBS_DIR, f"{job_id}.json").read_text())
+    except (OSError, ValueError):
+        return None
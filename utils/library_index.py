@@ -0,0 +1,323 @@
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils import duplicates, manifest, radarr_integration, shared_cache
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+LIBRARY_DB = os.path.join(CONFIG_PATH, 'library.db')
+LIBRARY_SCAN_INTERVAL = int(os.getenv('LIBRARY_SCAN_INTERVAL', '60'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    release_name TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Trigram full-text index over name and release name (substring search);
+# kept in sync with the files table by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+    name, release_name, content='files', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts (rowid, name, release_name) VALUES (new.id, new.name, new.release_name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name, release_name)
+    VALUES ('delete', old.id, old.name, old.release_name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name, release_name)
+    VALUES ('delete', old.id, old.name, old.release_name);
+    INSERT INTO files_fts (rowid, name, release_name) VALUES (new.id, new.name, new.release_name);
+END;
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+_has_fts = False
+
+
+def _connect():
+    global _schema_ready, _has_fts
+
+    conn = sqlite3.connect(LIBRARY_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                Path(LIBRARY_DB).parent.mkdir(parents=True, exist_ok=True)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+                try:
+                    conn.executescript(FTS_SCHEMA)
+                    _has_fts = True
+                except sqlite3.OperationalError as e:
+                    # SQLite without FTS5/trigram: search falls back to LIKE
+                    logger.warning(f"Trigram search unavailable, using LIKE: {e}")
+                conn.commit()
+                _schema_ready = True
+
+    return conn
+
+
+class LibraryIndexer:
+    """
+    Keeps the files table in sync with every video file under a root.
+
+    Each pass stats every known directory and only lists the ones whose
+    mtime changed (an entry was added, removed or renamed), so rescanning
+    an unchanged 50k-file library costs one stat() per directory.
+    """
+
+    def __init__(self, root, video_exts):
+        self.root = os.path.realpath(root)
+        self.video_exts = video_exts
+
+    def scan(self):
+        start = time.monotonic()
+        conn = _connect()
+        try:
+            known = {row['path']: row['mtime_ns'] for row in conn.execute('SELECT path, mtime_ns FROM dirs')}
+            children = {}
+            for row in conn.execute('SELECT path, parent FROM dirs'):
+                children.setdefault(row['parent'], []).append(row['path'])
+
+            seen = set()
+            rescanned = 0
+            stack = [self.root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    mtime_ns = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(directory)
+
+                if known.get(directory) == mtime_ns:
+                    stack.extend(children.get(directory, []))
+                    continue
+
+                subdirs = self._rescan_directory(conn, directory, mtime_ns)
+                rescanned += 1
+                stack.extend(subdirs)
+
+            removed = [d for d in known if d not in seen]
+            for directory in removed:
+                conn.execute('DELETE FROM dirs WHERE path = ?', (directory,))
+                conn.execute('DELETE FROM files WHERE dir = ?', (directory,))
+
+            updated = self._refresh_release_names(conn)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_scan', ?)",
+                (str(time.time()),)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        elapsed = time.monotonic() - start
+        if rescanned or removed or updated:
+            logger.info(
+                f"Library index: {rescanned} directories rescanned, {len(removed)} removed, "
+                f"{updated} release names updated in {elapsed:.2f}s"
+            )
+
+    def _rescan_directory(self, conn, directory, mtime_ns):
+        subdirs = []
+        files = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in self.video_exts:
+                            st = entry.stat()
+                            files[entry.path] = (entry.name, st.st_size, st.st_mtime)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"Cannot list {directory}: {e}")
+            return []
+
+        existing = {
+            row['path']: (row['size'], row['mtime'])
+            for row in conn.execute('SELECT path, size, mtime FROM files WHERE dir = ?', (directory,))
+        }
+        for path in existing.keys() - files.keys():
+            conn.execute('DELETE FROM files WHERE path = ?', (path,))
+        for path, (name, size, mtime) in files.items():
+            if existing.get(path) == (size, mtime):
+                continue
+            conn.execute(
+                'INSERT INTO files (path, dir, name, size, mtime) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime',
+                (path, directory, name, size, mtime)
+            )
+
+        conn.execute(
+            'INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)',
+            (directory, os.path.dirname(directory) if directory != self.root else None, mtime_ns)
+        )
+        return subdirs
+
+    def _refresh_release_names(self, conn):
+        """
+        Attach release names from the manifest (processed releases) and the
+        Radarr index; sourceTitles are fetched in bulk, never per file.
+        """
+        names = {}
+        movie_index = shared_cache.get('radarr', 'movie_index', memo=True)
+        if movie_index is None and radarr_integration.RADARR_URL and radarr_integration.RADARR_API_KEY:
+            try:
+                movie_index = radarr_integration.get_radarr_movie_index()
+            except Exception as e:
+                logger.debug(f"Radarr index unavailable for library index: {e}")
+        if movie_index:
+            # One paged history walk for the sourceTitles not cached yet
+            movies = list(movie_index.values())
+            radarr_integration.prefetch_source_titles([movie.get('id') for movie in movies])
+            radarr_names = radarr_integration.get_cached_release_names(movies)
+            for path, movie in movie_index.items():
+                names[path] = radarr_names[movie.get('id')][0]
+        names.update(manifest.release_names())
+
+        updated = 0
+        for row in conn.execute('SELECT id, path, release_name FROM files').fetchall():
+            name = names.get(row['path'], '')
+            if name != row['release_name']:
+                conn.execute('UPDATE files SET release_name = ? WHERE id = ?', (name, row['id']))
+                updated += 1
+        return updated
+
+
+def search(query, limit=50):
+    """
+    Substring search over file names and release names
+
+    Returns:
+        tuple (results, total)
+    """
+    query = query.strip()
+    if not query:
+        return [], 0
+
+    conn = _connect()
+    try:
+        if _has_fts and len(query) >= 3:
+            # A quoted FTS5 string matches the trigrams of the whole query
+            match = '"' + query.replace('"', '""') + '"'
+            where = 'id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)'
+            params = (match,)
+        else:
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where = "(name LIKE ? ESCAPE '\\' OR release_name LIKE ? ESCAPE '\\')"
+            params = (pattern, pattern)
+
+        total = conn.execute(f'SELECT COUNT(*) FROM files WHERE {where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT path, dir, name, release_name, size, mtime FROM files WHERE {where} '
+            'ORDER BY name LIMIT ?',
+            (*params, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return [dict(row) for row in rows], total
+
+
+def files_modified_before(timestamp):
+    """Indexed files not modified since timestamp, newest first"""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            'SELECT path, size, mtime FROM files WHERE mtime < ? ORDER BY mtime DESC',
+            (timestamp,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def status():
+    """Number of indexed files and time of the last completed scan"""
+    conn = _connect()
+    try:
+        files = conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+        row = conn.execute("SELECT value FROM meta WHERE key = 'last_scan'").fetchone()
+    finally:
+        conn.close()
+    return {
+        'files': files,
+        'last_scan': float(row['value']) if row else None,
+        'ready': row is not None
+    }
+
+
+_indexer_thread = None
+
+
+def start_background_indexer(root, video_exts, interval=LIBRARY_SCAN_INTERVAL):
+    """
+    Keep the index up to date from a daemon thread. With several worker
+    processes only the one holding the index lock scans; the others take
+    over if it exits.
+    """
+    global _indexer_thread
+    if _indexer_thread is not None:
+        return
+
+    lock_path = os.path.join(CONFIG_PATH, 'locks', 'library-index.lock')
+
+    def run():
+        indexer = LibraryIndexer(root, video_exts)
+        Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+        lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        holding = False
+        while True:
+            if not holding:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    holding = True
+                except BlockingIOError:
+                    pass
+            if holding:
+                try:
+                    indexer.scan()
+                    duplicates.backfill()
+                    shared_cache.maintain()
+                except Exception:
+                    logger.exception('Library index scan failed')
+            time.sleep(interval)
+
+    _indexer_thread = threading.Thread(target=run, name='library-indexer', daemon=True)
+    _indexer_thread.start()
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+MANIFEST_DB = os.path.join(CONFIG_PATH, 'manifest.db')
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    source_path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    input_key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    release_name TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (source_path, kind)
+);
+
+CREATE TABLE IF NOT EXISTS releases (
+    source_path TEXT PRIMARY KEY,
+    release_name TEXT NOT NULL,
+    video_path TEXT NOT NULL,
+    original_filename TEXT,
+    radarr_movie TEXT,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fingerprints (
+    source_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    sample TEXT NOT NULL,
+    infohash TEXT,
+    torrent_path TEXT,
+    release_name TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fingerprints_size ON fingerprints (size, sample);
+"""
+
+
+def _connect():
+    """Open the manifest database, creating it on first use"""
+    global _schema_ready
+
+    conn = sqlite3.connect(MANIFEST_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                Path(MANIFEST_DB).parent.mkdir(parents=True, exist_ok=True)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+                conn.commit()
+                _schema_ready = True
+
+    return conn
+
+
+def source_identity(video_path):
+    """
+    Identify a source file by inode and content metadata rather than by name,
+    so a touched or replaced file is never mistaken for the one we processed.
+    """
+    st = os.stat(video_path)
+    return {
+        'dev': st.st_dev,
+        'ino': st.st_ino,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns
+    }
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-serialisable inputs"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path):
+    """SHA-256 of a (small) output file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_output(source_path, kind):
+    """Return the recorded output for a source file, or None"""
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT * FROM outputs WHERE source_path = ? AND kind = ?',
+                (str(source_path), kind)
+            ).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+    except Exception as e:
+        logger.warning(f"Manifest lookup failed: {e}")
+        return None
+
+
+def is_current(source_path, kind, input_key):
+    """
+    Check whether the output recorded for (source_path, kind) was produced
+    from the same inputs and is still on disk untouched.
+
+    Returns:
+        The recorded output path (str) if it can be reused, otherwise None
+    """
+    record = get_output(source_path, kind)
+    if not record or record['input_key'] != input_key:
+        return None
+
+    output_path = Path(record['path'])
+    if not output_path.is_file():
+        return None
+
+    try:
+        if file_sha256(output_path) != record['sha256']:
+            logger.info(f"Output modified since last run: {output_path}")
+            return None
+    except OSError:
+        return None
+
+    return str(output_path)
+
+
+def record_output(source_path, kind, input_key, output_path, release_name=None):
+    """Remember that output_path was generated for source_path from input_key"""
+    try:
+        sha256 = file_sha256(output_path)
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO outputs '
+                '(source_path, kind, input_key, path, sha256, release_name, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (str(source_path), kind, input_key, str(output_path), sha256,
+                 release_name, time.time())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        logger.warning(f"Could not record {kind} in manifest: {e}")
+        return False
+
+
+def release_names():
+    """Map source path -> release name of every processed file"""
+    try:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                'SELECT source_path, release_name FROM outputs '
+                'WHERE release_name IS NOT NULL ORDER BY updated_at'
+            ).fetchall()
+        finally:
+            conn.close()
+        return {row['source_path']: row['release_name'] for row in rows}
+    except Exception as e:
+        logger.warning(f"Manifest read failed: {e}")
+        return {}
+
+
+def outputs_for(source_paths):
+    """
+    Outputs recorded for several source files at once
+
+    Returns:
+        dict {source_path: {'kinds': [...], 'release_name': str, 'updated_at': float}}
+        for the paths that have been processed
+    """
+    paths = list(dict.fromkeys(str(p) for p in source_paths))
+    found = {}
+    try:
+        conn = _connect()
+        try:
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT source_path, kind, release_name, updated_at FROM outputs "
+                    f"WHERE source_path IN ({','.join('?' * len(chunk))}) ORDER BY updated_at",
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    entry = found.setdefault(row['source_path'], {'kinds': []})
+                    entry['kinds'].append(row['kind'])
+                    entry['release_name'] = row['release_name']
+                    entry['updated_at'] = row['updated_at']
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Manifest read failed: {e}")
+    return found
+
+
+def record_release(source_path, release_name, video_path, original_filename, radarr_movie):
+    """Remember the inputs of a processed release, so it can be re-rendered offline"""
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO releases '
+                '(source_path, release_name, video_path, original_filename, radarr_movie, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (str(source_path), release_name, str(video_path), original_filename,
+                 json.dumps(radarr_movie) if radarr_movie else None, time.time())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        logger.warning(f"Could not record release in manifest: {e}")
+        return False
+
+
+def releases():
+    """Every recorded release, with its Radarr movie decoded"""
+    conn = _connect()
+    try:
+        rows = conn.execute('SELECT * FROM releases ORDER BY source_path').fetchall()
+    finally:
+        conn.close()
+    return [
+        {**dict(row), 'radarr_movie': json.loads(row['radarr_movie']) if row['radarr_movie'] else None}
+        for row in rows
+    ]
+
+
+def record_fingerprint(source_path, size, sample, infohash, torrent_path, release_name):
+    """Remember the size/sample fingerprint and torrent of a processed file"""
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO fingerprints '
+                '(source_path, size, sample, infohash, torrent_path, release_name, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (str(source_path), size, sample, infohash, str(torrent_path) if torrent_path else None,
+                 release_name, time.time())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        logger.warning(f"Could not record fingerprint: {e}")
+        return False
+
+
+def fingerprints_matching(size, sample=None):
+    """Processed files with this size (and sample fingerprint, if given)"""
+    try:
+        conn = _connect()
+        try:
+            if sample is None:
+                rows = conn.execute('SELECT * FROM fingerprints WHERE size = ?', (size,)).fetchall()
+            else:
+                rows = conn.execute(
+                    'SELECT * FROM fingerprints WHERE size = ? AND sample = ?', (size, sample)
+                ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.warning(f"Manifest read failed: {e}")
+        return []
+
+
+def fingerprinted_sizes(sizes):
+    """Map size -> {source path: sample fingerprint} of processed files, for the given sizes"""
+    sizes = list(dict.fromkeys(sizes))
+    found = {}
+    try:
+        conn = _connect()
+        try:
+            for i in range(0, len(sizes), 500):
+                chunk = sizes[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT size, source_path, sample FROM fingerprints "
+                    f"WHERE size IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    found.setdefault(row['size'], {})[row['source_path']] = row['sample']
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Manifest read failed: {e}")
+    return found
+
+
+def unfingerprinted_torrents():
+    """(source_path, torrent path, release_name) of processed files without a fingerprint"""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT o.source_path, o.path, o.release_name FROM outputs o "
+            "LEFT JOIN fingerprints f ON f.source_path = o.source_path "
+            "WHERE o.kind = 'torrent' AND f.source_path IS NULL"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [tuple(row) for row in rows]
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics, remote_worker, shared_cache
+
+logger = logging.getLogger(__name__)
+
+# mediainfo output formats used by the generators
+FORMAT_ARGS = {
+    'full': ['--Full'],
+    'json': ['--Output=JSON'],
+}
+
+# probe_many(): files per mediainfo process, and processes run at once
+PROBE_BATCH_SIZE = int(os.getenv('PROBE_BATCH_SIZE', '32'))
+PROBE_WORKERS = int(os.getenv('PROBE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+
+def run_mediainfo(video_path, output_format='full'):
+    """
+    Return mediainfo output for a file, cached across workers
+
+    The cache is keyed by inode/size/mtime, so the hardlinked copy in the
+    torrent folder shares the entry of its source file. Callers must not
+    rely on the paths embedded in the output (Complete name, Folder name,
+    File name...): render_nfo() rewrites them for the release.
+
+    Args:
+        video_path: Path to video file
+        output_format: 'full' (text report) or 'json'
+
+    Returns:
+        str: mediainfo stdout
+
+    Raises:
+        subprocess.CalledProcessError if mediainfo fails
+    """
+    key = f"{shared_cache.file_key(video_path)}:{output_format}"
+    cached = shared_cache.get('probe', key)
+    if cached is not None:
+        logger.debug(f"Probe cache hit: {video_path} ({output_format})")
+        metrics.PROBE_CACHE.inc(result='hit')
+        return cached
+    metrics.PROBE_CACHE.inc(result='miss')
+
+    output = None
+    if remote_worker.enabled():
+        # mediainfo reads headers scattered through the file: cheaper on the
+        # storage host than over the network mount
+        try:
+            output = remote_worker.probe(video_path, output_format)
+        except remote_worker.WorkerUnavailable as e:
+            logger.warning(f"Hashing worker unavailable, probing locally: {e}")
+
+    if output is None:
+        cmd = ['mediainfo', *FORMAT_ARGS[output_format], str(video_path)]
+        with metrics.MEDIAINFO_SECONDS.time(format=output_format):
+            output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+
+    shared_cache.put('probe', key, output)
+    return output
+
+
+def _split_full(output):
+    """
+    Per-file reports of a multi-file text output, keyed by Complete name.
+    Each report starts at its General section; the blank lines separating
+    reports are replaced by the ending of the last one, so every report is
+    identical to a single-file run.
+    """
+    ending = output[len(output.rstrip('\n')):]
+    starts = [m.start() for m in re.finditer(r'(?m)^General\s*$', output)]
+    reports = {}
+    for start, end in zip(starts, starts[1:] + [len(output)]):
+        report = output[start:end].rstrip('\n') + ending
+        match = re.search(r'(?m)^Complete name\s+: (.+)$', report)
+        if match:
+            reports[match.group(1).rstrip()] = report
+    return reports
+
+
+def _split_json(output):
+    """Per-file documents of a multi-file JSON output, keyed by @ref"""
+    data = json.loads(output)
+    if isinstance(data, dict):
+        data = [data]
+    return {
+        item['media']['@ref']: json.dumps(item)
+        for item in data
+        if isinstance(item, dict) and item.get('media')
+    }
+
+
+SPLITTERS = {
+    'full': _split_full,
+    'json': _split_json,
+}
+
+
+def _probe_batch(video_paths, output_format):
+    """One mediainfo process for several files; {path: output}"""
+    cmd = ['mediainfo', *FORMAT_ARGS[output_format], *video_paths]
+    try:
+        with metrics.MEDIAINFO_SECONDS.time(format=output_format):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        return SPLITTERS[output_format](result.stdout)
+    except Exception as e:
+        logger.warning(f"Batched mediainfo failed ({len(video_paths)} files, {output_format}): {e}")
+        return {}
+
+
+def probe_many(video_paths, formats=tuple(FORMAT_ARGS), batch_size=PROBE_BATCH_SIZE, workers=PROBE_WORKERS):
+    """
+    Fill the probe cache for many files at once, for bulk paths (re-render,
+    backlogs): missing probes are sent in batches to a bounded number of
+    mediainfo processes, and the combined output is split back per file.
+
+    Files mediainfo could not read in a batch are left out; run_mediainfo()
+    probes them on its own later and reports the error.
+
+    Args:
+        video_paths: Files to probe
+        formats: Output formats to cache, among FORMAT_ARGS
+        batch_size: Files per mediainfo process
+        workers: mediainfo processes run concurrently
+
+    Returns:
+        int: number of probes added to the cache
+    """
+    if remote_worker.enabled():
+        # Probes run on the storage host, one request per file
+        return 0
+
+    file_keys = {}
+    for path in video_paths:
+        try:
+            file_keys[str(path)] = shared_cache.file_key(path)
+        except OSError:
+            continue
+
+    jobs = []
+    for output_format in formats:
+        wanted = {path: f"{key}:{output_format}" for path, key in file_keys.items()}
+        cached = shared_cache.get_many('probe', wanted.values())
+        missing = [path for path, key in wanted.items() if key not in cached]
+        for i in range(0, len(missing), max(1, batch_size)):
+            jobs.append((output_format, missing[i:i + max(1, batch_size)]))
+    if not jobs:
+        return 0
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='probe') as pool:
+        outputs = pool.map(lambda job: _probe_batch(job[1], job[0]), jobs)
+        for (output_format, batch), reports in zip(jobs, outputs):
+            values = {
+                f"{file_keys[path]}:{output_format}": reports[path]
+                for path in batch
+                if path in reports
+            }
+            if values:
+                shared_cache.put_many('probe', values)
+                added += len(values)
+
+    logger.info(f"Probed {added} file/format pairs in {len(jobs)} mediainfo runs")
+    return added
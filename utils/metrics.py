@@ -0,0 +1,352 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import timeline
+from utils.atomic_io import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REGISTRY = []
+
+# Where each worker process publishes its metrics so that /metrics, served by
+# whichever worker gets the scrape, can report totals for all of them
+_export_dir = None
+_export_thread = None
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(k), v] for k, v in self._values.items()]
+        return {
+            'kind': self.kind,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': samples
+        }
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn):
+        """Read the (unlabelled) value from fn() at collection time"""
+        self._function = fn
+
+    def snapshot(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} callback failed: {e}")
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, span=None):
+        """
+        span: optional (kind, name template) - blocks timed with time() are
+              also added to the current request timeline, if one is being
+              recorded, e.g. ('subprocess', 'mediainfo {format}')
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.span = span
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (1 if value <= bound else 0) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+    @contextmanager
+    def time(self, errors=None, span=None, **labels):
+        """
+        Observe the duration of the block; count raised exceptions in errors.
+        span overrides the metric's timeline span for this block.
+        """
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            if errors is not None:
+                errors.inc(**labels)
+            raise
+        finally:
+            end = time.perf_counter()
+            self.observe(end - start, **labels)
+
+            current = timeline.current()
+            span = span or self.span
+            if current is not None and span:
+                kind, template = span
+                attrs = {'failed': True} if failed else {}
+                current.add_span(kind, template.format(**labels), start, end, **attrs)
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+CREATE_STAGE_SECONDS = Histogram(
+    'torrentify_create_stage_duration_seconds',
+    'Duration of each /create pipeline stage',
+    ['stage'],
+    span=('stage', '{stage}')
+)
+MEDIAINFO_SECONDS = Histogram(
+    'torrentify_mediainfo_duration_seconds',
+    'mediainfo run time (full = NFO, json = BBCode description)',
+    ['format'],
+    span=('subprocess', 'mediainfo {format}')
+)
+PROBE_CACHE = Counter(
+    'torrentify_probe_cache_total',
+    'mediainfo probe cache lookups',
+    ['result']
+)
+HASH_SECONDS = Histogram(
+    'torrentify_hash_duration_seconds',
+    'Time spent hashing files for torrents',
+    span=('subprocess', 'mktorrent')
+)
+HASH_BYTES = Counter(
+    'torrentify_hashed_bytes_total',
+    'Bytes read to hash torrent pieces'
+)
+HASH_THROUGHPUT = Histogram(
+    'torrentify_hash_throughput_bytes_per_second',
+    'Hashing throughput per torrent',
+    buckets=tuple(mb * 1024 * 1024 for mb in (10, 25, 50, 100, 200, 400, 800, 1600, 3200))
+)
+PREHASH_BYTES = Counter(
+    'torrentify_prehashed_bytes_total',
+    'Bytes read by speculative pre-hashing of unprocessed files'
+)
+PIECE_CACHE = Counter(
+    'torrentify_piece_cache_total',
+    'Piece-hash cache lookups',
+    ['result']
+)
+HTTP_SECONDS = Histogram(
+    'torrentify_http_request_duration_seconds',
+    'Outgoing HTTP request latency',
+    ['service', 'endpoint'],
+    span=('http', '{service} {endpoint}')
+)
+HTTP_ERRORS = Counter(
+    'torrentify_http_request_errors_total',
+    'Outgoing HTTP requests that failed',
+    ['service', 'endpoint']
+)
+LINK_METHODS = Counter(
+    'torrentify_link_total',
+    'Files placed by method (hardlink, symlink, copy, skipped)',
+    ['destination', 'method']
+)
+COPY_BYTES = Counter(
+    'torrentify_copied_bytes_total',
+    'Bytes copied when a hardlink was not possible, by copy method',
+    ['method']
+)
+DISCORD_OUTBOX = Gauge(
+    'torrentify_discord_outbox_pending',
+    'Discord notifications waiting to be sent'
+)
+JOBS_IN_FLIGHT = Gauge(
+    'torrentify_create_jobs_in_flight',
+    '/create pipelines currently running'
+)
+JOBS_WAITING = Gauge(
+    'torrentify_create_jobs_waiting',
+    '/create requests waiting on a running job for the same file'
+)
+
+
+def http_call(service, endpoint):
+    """Time an outgoing HTTP call and count it as an error if it raises"""
+    return HTTP_SECONDS.time(errors=HTTP_ERRORS, service=service, endpoint=endpoint)
+
+
+def observe_hashing(nbytes, seconds):
+    """Account bytes hashed (the duration itself is timed with HASH_SECONDS)"""
+    HASH_BYTES.inc(nbytes)
+    timeline.count('bytes_hashed', nbytes)
+    if seconds > 0:
+        HASH_THROUGHPUT.observe(nbytes / seconds)
+
+
+# ---------------------------------------------------------------------------
+# Collection and exposition
+# ---------------------------------------------------------------------------
+
+def _local_snapshot():
+    return {m.name: m.snapshot() for m in REGISTRY}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _merge(target, source, include_gauges):
+    for name, metric in source.items():
+        if metric['kind'] == 'gauge' and not include_gauges:
+            continue
+        merged = target.setdefault(name, {**metric, 'samples': []})
+        index = {tuple(labels): i for i, (labels, _) in enumerate(merged['samples'])}
+        for labels, value in metric['samples']:
+            i = index.get(tuple(labels))
+            if i is None:
+                index[tuple(labels)] = len(merged['samples'])
+                merged['samples'].append([labels, value])
+                continue
+            current = merged['samples'][i][1]
+            if metric['kind'] == 'histogram':
+                merged['samples'][i][1] = (
+                    [a + b for a, b in zip(current[0], value[0])],
+                    current[1] + value[1],
+                    current[2] + value[2]
+                )
+            else:
+                merged['samples'][i][1] = current + value
+
+
+def collect():
+    """Metrics of this process plus the last export of every other worker"""
+    merged = {}
+    _merge(merged, _local_snapshot(), include_gauges=True)
+
+    if _export_dir:
+        for path in Path(_export_dir).glob('*.json'):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            # Counters of exited workers still count; their gauges do not
+            _merge(merged, data, include_gauges=_pid_alive(pid))
+
+    return merged
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    ]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def render():
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, metric in sorted(collect().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric['labelnames']
+        for labels, value in metric['samples']:
+            if metric['kind'] == 'histogram':
+                counts, total, count = value
+                for bound, c in zip(metric['buckets'], counts):
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, ('le', repr(float(bound))))} {c}")
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, ('le', '+Inf'))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {count}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset_exports(directory):
+    """Forget exports left by a previous server run (call once, before workers start)"""
+    for path in Path(directory).glob('*.json'):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def start_exporter(directory, interval=5.0):
+    """Periodically publish this process's metrics for the other workers"""
+    global _export_dir, _export_thread
+
+    _export_dir = directory
+    if _export_thread is not None:
+        return
+
+    Path(directory).mkdir(parents=True, exist_ok=True)
+
+    def export_loop():
+        target = Path(directory) / f"{os.getpid()}.json"
+        while True:
+            try:
+                atomic_write_text(target, json.dumps(_local_snapshot()))
+            except Exception as e:
+                logger.debug(f"Metrics export failed: {e}")
+            time.sleep(interval)
+
+    _export_thread = threading.Thread(target=export_loop, name='metrics-exporter', daemon=True)
+    _export_thread.start()
@@ -4,90 +4,103 @@ from datetime import datetime
 from pathlib import Path
 import re
 
+from utils.atomic_io import atomic_write_text
+from utils.media_probe import run_mediainfo
+
 logger = logging.getLogger(__name__)
 
 
-def generate_nfo(video_path, output_path, template='full', extra_info=None):
+ADDED_ON_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_added_on(nfo_content):
+    """'Added On' date of an existing NFO's content, or None"""
+    match = re.search(r'^Added On\s+: (.+)$', nfo_content, re.M)
+    return match.group(1).strip() if match else None
+
+
+def render_nfo(video_path, template='full', extra_info=None):
     """
-    Generate NFO file using mediainfo with custom formatting
+    Build the NFO content (see generate_nfo for the arguments)
+
+    extra_info may also contain 'added_on' to keep the date of an existing
+    NFO, so re-rendering an unchanged release gives identical content.
+
+    Raises:
+        subprocess.CalledProcessError if mediainfo fails
+    """
+    video_file = Path(video_path)
     
-    Args:
-        video_path: Path to video file
-        output_path: Path where NFO file will be saved
-        template: Output format (full, basic, or custom)
-        extra_info: Optional dict with additional metadata:
-            - release_name: Release name (sourceTitle from Radarr)
-            - original_filename: Original filename after Radarr rename
-            - radarr_movie: Full Radarr movie metadata dict
+    # Determine release name
+    if extra_info and extra_info.get('release_name'):
+        release_name = extra_info['release_name']
+    else:
+        release_name = video_file.stem
     
-    Returns:
-        dict with status and message
-    """
-    try:
-        video_file = Path(video_path)
-        
-        # Determine release name
-        if extra_info and extra_info.get('release_name'):
-            release_name = extra_info['release_name']
-        else:
-            release_name = video_file.stem
-        
-        # Get MediaInfo output
-        cmd = ['mediainfo', '--Full', video_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        mediainfo_content = result.stdout
-        
-        # Replace "Complete name" with release name + extension
-        video_extension = video_file.suffix
-        release_filename = f"{release_name}{video_extension}"
-        
-        # Replace the Complete name line in mediainfo
+    # Get MediaInfo output
+    mediainfo_content = run_mediainfo(video_path, 'full')
+    
+    # Replace "Complete name" with release name + extension
+    video_extension = video_file.suffix
+    release_filename = f"{release_name}{video_extension}"
+    
+    # The cached probe may come from another path to the same file (source,
+    # earlier release folder, remote worker): rewrite every path line
+    path_lines = {
+        'Complete name': release_filename,
+        'Folder name': (extra_info or {}).get('folder_name') or str(video_file.parent),
+        'File name extension': release_filename,
+        'File name': release_name,
+        'File extension': video_extension.lstrip('.'),
+    }
+    for label, value in path_lines.items():
         mediainfo_content = re.sub(
-            r'Complete name\s+: .+',
-            f'Complete name                            : {release_filename}',
-            mediainfo_content
+            rf'^({re.escape(label)}\s+: ).*$',
+            lambda match: match.group(1) + value,
+            mediainfo_content,
+            flags=re.M
         )
-        
-        # Create custom formatted NFO
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Build header with release info
-        header = f"""================================================================================
+    
+    # Create custom formatted NFO
+    current_time = (extra_info or {}).get('added_on') or datetime.now().strftime(ADDED_ON_FORMAT)
+    
+    # Build header with release info
+    header = f"""================================================================================
                            RELEASE INFORMATION
 ================================================================================
 
 Release Name    : {release_name}
 """
+    
+    # Add Radarr metadata if available
+    if extra_info and extra_info.get('radarr_movie'):
+        movie = extra_info['radarr_movie']
+        header += f"\n"
+        header += f"Title           : {movie.get('title', 'N/A')}\n"
+        header += f"Year            : {movie.get('year', 'N/A')}\n"
         
-        # Add Radarr metadata if available
-        if extra_info and extra_info.get('radarr_movie'):
-            movie = extra_info['radarr_movie']
-            header += f"\n"
-            header += f"Title           : {movie.get('title', 'N/A')}\n"
-            header += f"Year            : {movie.get('year', 'N/A')}\n"
-            
-            if movie.get('tmdbId'):
-                header += f"TMDb ID         : {movie.get('tmdbId')}\n"
-            
-            if movie.get('imdbId'):
-                header += f"IMDb ID         : {movie.get('imdbId')}\n"
-            
-            # Quality info
-            movie_file = movie.get('movieFile', {})
-            if movie_file:
-                quality = movie_file.get('quality', {}).get('quality', {})
-                if quality.get('name'):
-                    header += f"Quality         : {quality.get('name')}\n"
-                
-                # Edition
-                edition = movie_file.get('edition', '').strip()
-                if edition:
-                    header += f"Edition         : {edition}\n"
+        if movie.get('tmdbId'):
+            header += f"TMDb ID         : {movie.get('tmdbId')}\n"
         
-        header += f"\nAdded On        : {current_time}\n"
+        if movie.get('imdbId'):
+            header += f"IMDb ID         : {movie.get('imdbId')}\n"
         
-        # Assemble final NFO
-        nfo_content = f"""{header}
+        # Quality info
+        movie_file = movie.get('movieFile', {})
+        if movie_file:
+            quality = movie_file.get('quality', {}).get('quality', {})
+            if quality.get('name'):
+                header += f"Quality         : {quality.get('name')}\n"
+            
+            # Edition
+            edition = movie_file.get('edition', '').strip()
+            if edition:
+                header += f"Edition         : {edition}\n"
+    
+    header += f"\nAdded On        : {current_time}\n"
+    
+    # Assemble final NFO
+    nfo_content = f"""{header}
 ================================================================================
                            TECHNICAL INFORMATION
 ================================================================================
@@ -98,10 +111,32 @@ Release Name    : {release_name}
                         Generated by Torrent-nfo-creator
 ================================================================================
 """
+    return nfo_content
+
+
+def generate_nfo(video_path, output_path, template='full', extra_info=None):
+    """
+    Generate NFO file using mediainfo with custom formatting
+    
+    Args:
+        video_path: Path to video file
+        output_path: Path where NFO file will be saved
+        template: Output format (full, basic, or custom)
+        extra_info: Optional dict with additional metadata:
+            - release_name: Release name (sourceTitle from Radarr)
+            - original_filename: Original filename after Radarr rename
+            - radarr_movie: Full Radarr movie metadata dict
+            - folder_name: Folder shown in the NFO (default: the
+              folder of video_path)
+    
+    Returns:
+        dict with status and message
+    """
+    try:
+        nfo_content = render_nfo(video_path, template, extra_info)
         
         # Write to file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(nfo_content)
+        atomic_write_text(output_path, nfo_content)
         
         logger.info(f"NFO created successfully: {output_path}")
         return {
@@ -0,0 +1,204 @@
+"""
+Speculative pre-hashing: fills the piece-hash cache for library files that
+have not been processed yet, so a later /create builds the torrent from
+cached pieces instead of reading the whole file.
+
+Runs from a daemon thread at idle I/O and lowest CPU priority, pauses
+while /create jobs are running (in any worker process) and stops for the
+day once PREHASH_DAILY_GB have been read.
+"""
+import ctypes
+import datetime
+import fcntl
+import logging
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import library_index, metrics, shared_cache
+from utils.torrent_creator import hash_file, piece_length
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+PREHASH_ENABLED = os.getenv('PREHASH_ENABLED', 'false').lower() == 'true'
+PREHASH_DAILY_BYTES = int(float(os.getenv('PREHASH_DAILY_GB', '200')) * 1024 ** 3)
+# Files modified more recently may still be downloading or being imported
+PREHASH_MIN_AGE = int(os.getenv('PREHASH_MIN_AGE', '3600'))
+PREHASH_INTERVAL = int(os.getenv('PREHASH_INTERVAL', '600'))
+BUSY_POLL_INTERVAL = 2
+# Budget accounting and the check for running jobs happen every this many bytes
+CHECK_EVERY_BYTES = 256 * 1024 * 1024
+
+INTERACTIVE_LOCK = os.path.join(CONFIG_PATH, 'locks', 'interactive-jobs.lock')
+
+# ioprio_set(2) has no Python wrapper; syscall numbers per architecture
+IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'aarch64': 30, 'armv7l': 314, 'i686': 289}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+_prehash_thread = None
+
+
+@contextmanager
+def interactive_job():
+    """Mark an interactive job as running; pre-hashing pauses meanwhile"""
+    Path(INTERACTIVE_LOCK).parent.mkdir(parents=True, exist_ok=True)
+    with open(INTERACTIVE_LOCK, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        yield
+
+
+def jobs_running():
+    """True while any worker process is inside interactive_job()"""
+    try:
+        with open(INTERACTIVE_LOCK, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except OSError:
+        pass
+    return False
+
+
+def lower_priority():
+    """Idle I/O class and nice 19 for the calling thread (Linux)"""
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Could not lower CPU priority: {e}")
+
+    syscall = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if syscall is None:
+        logger.info('Idle I/O priority not supported here, pre-hashing at normal I/O priority')
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(syscall, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) != 0:
+        logger.info(f"ioprio_set failed ({os.strerror(ctypes.get_errno())}), "
+                    f"pre-hashing at normal I/O priority")
+
+
+def _budget_key():
+    return f"bytes:{datetime.date.today().isoformat()}"
+
+
+def bytes_today():
+    """Bytes read by pre-hashing today, across restarts and processes"""
+    return shared_cache.get('prehash', _budget_key()) or 0
+
+
+def _spend(nbytes):
+    shared_cache.put('prehash', _budget_key(), bytes_today() + nbytes, ttl=2 * 86400)
+
+
+class PreHasher:
+    """Hashes unprocessed library files into the 'pieces' cache"""
+
+    def __init__(self, piece_size=0, daily_bytes=PREHASH_DAILY_BYTES, min_age=PREHASH_MIN_AGE):
+        self.piece_size = piece_size
+        self.daily_bytes = daily_bytes
+        self.min_age = min_age
+
+    def candidates(self):
+        """Indexed files old enough and without cached pieces, newest first"""
+        files = library_index.files_modified_before(time.time() - self.min_age)
+        keys = {}
+        for file in files:
+            try:
+                length = piece_length(self.piece_size, file['size'])
+                keys[file['path']] = f"{shared_cache.file_key(file['path'])}:{length}"
+            except OSError:
+                continue
+        cached = shared_cache.get_many('pieces', keys.values())
+        return [file for file in files if file['path'] in keys and keys[file['path']] not in cached]
+
+    def _wait_while_busy(self):
+        while jobs_running():
+            time.sleep(BUSY_POLL_INTERVAL)
+
+    def hash_one(self, path):
+        """
+        Hash one file into the pieces cache, pausing between chunks while
+        jobs run. Returns False if the file changed while it was read.
+        """
+        key = shared_cache.file_key(path)
+        size = os.path.getsize(path)
+        length = piece_length(self.piece_size, size)
+        counted = [0]
+
+        def progress(hashed, total):
+            if hashed - counted[0] < CHECK_EVERY_BYTES and hashed < total:
+                return
+            _spend(hashed - counted[0])
+            metrics.PREHASH_BYTES.inc(hashed - counted[0])
+            counted[0] = hashed
+            # Blocking here stops the reads until the job is done
+            self._wait_while_busy()
+
+        pieces, _ = hash_file(path, length, with_digests=False, progress=progress, observe=False)
+        if shared_cache.file_key(path) != key:
+            logger.info(f"Pre-hash discarded, file changed while reading: {path}")
+            return False
+        shared_cache.put('pieces', f"{key}:{length}", pieces)
+        logger.info(f"Pre-hashed {path} ({size / 1024 ** 3:.1f} GB)")
+        return True
+
+    def run_once(self):
+        """Pre-hash candidates until none is left or the daily budget is spent"""
+        hashed = 0
+        for file in self.candidates():
+            self._wait_while_busy()
+            remaining = self.daily_bytes - bytes_today()
+            if remaining <= 0:
+                logger.info('Pre-hashing daily budget spent, resuming tomorrow')
+                break
+            if file['size'] > remaining:
+                continue
+            try:
+                if self.hash_one(file['path']):
+                    hashed += 1
+            except OSError as e:
+                logger.warning(f"Pre-hashing {file['path']} failed: {e}")
+        return hashed
+
+
+def start_prehasher(piece_size=0, interval=PREHASH_INTERVAL):
+    """
+    Pre-hash from a daemon thread when PREHASH_ENABLED is set. With several
+    worker processes only the one holding the pre-hash lock runs.
+    """
+    global _prehash_thread
+    if not PREHASH_ENABLED or _prehash_thread is not None:
+        return
+
+    lock_path = os.path.join(CONFIG_PATH, 'locks', 'prehash.lock')
+
+    def run():
+        lower_priority()
+        prehasher = PreHasher(piece_size)
+        Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+        lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        holding = False
+        while True:
+            if not holding:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    holding = True
+                except BlockingIOError:
+                    pass
+            if holding:
+                try:
+                    prehasher.run_once()
+                except Exception:
+                    logger.exception('Pre-hashing failed')
+            time.sleep(interval)
+
+    _prehash_thread = threading.Thread(target=run, name='prehash', daemon=True)
+    _prehash_thread.start()
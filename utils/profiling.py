@@ -0,0 +1,162 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from utils import timeline
+from utils.atomic_io import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+PROFILE_DIR = os.path.join(CONFIG_PATH, 'profiles')
+
+# Endpoints profiled on every call, e.g. "create,browse" (empty = only on request)
+PROFILE_REQUESTS = {
+    e.strip() for e in os.getenv('PROFILE_REQUESTS', '').lower().split(',') if e.strip()
+}
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}-[0-9]{6}-[a-z_]+-[0-9a-f]{8}$')
+
+# cProfile cannot always run twice at once (one profiler per interpreter on
+# Python 3.12+); a request arriving while another is profiled gets only a
+# timeline
+_profiler_lock = threading.Lock()
+
+
+def _requested(endpoint, request):
+    if endpoint in PROFILE_REQUESTS or 'all' in PROFILE_REQUESTS:
+        return True
+    if request.args.get('profile', '').lower() in ('1', 'true', 'yes'):
+        return True
+    if request.is_json:
+        body = request.get_json(silent=True)
+        return isinstance(body, dict) and bool(body.get('profile'))
+    return False
+
+
+def profiled(endpoint):
+    """
+    Route decorator: when profiling is requested (?profile=1, "profile": true
+    in the JSON body, or PROFILE_REQUESTS), run the view under cProfile with
+    a stage timeline and save both under CONFIG_PATH/profiles. Otherwise the
+    view is called directly.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request
+
+            if not _requested(endpoint, request):
+                return view(*args, **kwargs)
+            return _run_profiled(endpoint, request, view, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _run_profiled(endpoint, request, view, args, kwargs):
+    profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{endpoint}-{uuid.uuid4().hex[:8]}"
+    recorded = timeline.Timeline()
+    profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+
+    try:
+        with timeline.recording(recorded):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        if profiler is not None:
+            _profiler_lock.release()
+
+    status = response[1] if isinstance(response, tuple) and len(response) > 1 else 200
+    try:
+        _save(profile_id, endpoint, request, recorded, profiler, status)
+    except Exception as e:
+        logger.warning(f"Could not save profile {profile_id}: {e}")
+        return response
+
+    logger.info(f"Profile saved: {profile_id}")
+    if isinstance(response, tuple):
+        response[0].headers['X-Profile-Id'] = profile_id
+    else:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _save(profile_id, endpoint, request, recorded, profiler, status):
+    Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+
+    top_functions = []
+    if profiler is not None:
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        top_functions = out.getvalue().splitlines()
+
+    body = request.get_json(silent=True) if request.is_json else None
+    report = {
+        'id': profile_id,
+        'endpoint': endpoint,
+        'status': status,
+        'args': request.args.to_dict(),
+        'video_path': body.get('video_path') if isinstance(body, dict) else None,
+        'has_cprofile': profiler is not None,
+        'timeline': recorded.to_dict(),
+        'top_functions': top_functions
+    }
+    atomic_write_text(
+        os.path.join(PROFILE_DIR, f"{profile_id}.json"),
+        json.dumps(report, indent=2)
+    )
+    _prune()
+
+
+def _prune():
+    reports = sorted(Path(PROFILE_DIR).glob('*.json'))
+    for old in reports[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for path in (old, old.with_suffix('.prof')):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Summaries of saved profiles, newest first"""
+    profiles = []
+    for path in sorted(Path(PROFILE_DIR).glob('*.json'), reverse=True):
+        try:
+            report = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        profiles.append({
+            'id': report['id'],
+            'endpoint': report['endpoint'],
+            'status': report['status'],
+            'video_path': report.get('video_path'),
+            'started_at': report['timeline']['started_at'],
+            'summary': report['timeline']['summary'],
+            'has_cprofile': report['has_cprofile']
+        })
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    """Path of a saved profile file, or None if the id is invalid or unknown"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = Path(PROFILE_DIR) / f"{profile_id}{suffix}"
+    return path if path.is_file() else None
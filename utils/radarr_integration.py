@@ -3,11 +3,59 @@ import os
 import logging
 from pathlib import Path
 
+from utils import metrics, shared_cache
+
 logger = logging.getLogger(__name__)
 
 RADARR_URL = os.getenv('RADARR_URL', '').rstrip('/')
 RADARR_API_KEY = os.getenv('RADARR_API_KEY', '')
 
+# Durée de vie de l'index des films et des sourceTitle partagés entre workers
+RADARR_CACHE_TTL = int(os.getenv('RADARR_CACHE_TTL', '300'))
+SOURCE_TITLE_CACHE_TTL = int(os.getenv('SOURCE_TITLE_CACHE_TTL', '21600'))
+# Délai minimal entre deux reconstructions de l'index déclenchées par un
+# fichier absent (film importé depuis la dernière reconstruction)
+RADARR_MISS_REFRESH_INTERVAL = int(os.getenv('RADARR_MISS_REFRESH_INTERVAL', '60'))
+
+
+def get_radarr_movie_index(refresh=False):
+    """
+    Retourne l'index {chemin de fichier résolu: movie} de la bibliothèque Radarr.
+    L'index est partagé entre workers via le cache et reconstruit après
+    RADARR_CACHE_TTL secondes (ou immédiatement si refresh=True).
+    """
+    if not refresh:
+        index = shared_cache.get('radarr', 'movie_index', memo=True)
+        if index is not None:
+            return index
+    
+    headers = {'X-Api-Key': RADARR_API_KEY}
+    with metrics.http_call('radarr', 'movie'):
+        response = requests.get(f"{RADARR_URL}/api/v3/movie", headers=headers, timeout=10)
+        response.raise_for_status()
+    movies = response.json()
+    
+    index = {}
+    for movie in movies:
+        if not movie.get('hasFile'):
+            continue
+        
+        # Récupérer le movieFile
+        movie_file = movie.get('movieFile')
+        if not movie_file:
+            continue
+        
+        radarr_file_path = movie_file.get('path', '')
+        if not radarr_file_path:
+            continue
+        
+        index[str(Path(radarr_file_path).resolve())] = movie
+    
+    shared_cache.put('radarr', 'movie_index', index, ttl=RADARR_CACHE_TTL)
+    logger.info(f"Index Radarr reconstruit: {len(index)} fichiers")
+    return index
+
+
 def get_radarr_movie_by_path(video_path):
     """
     Trouve le film Radarr correspondant à un chemin de fichier.
@@ -18,30 +66,19 @@ def get_radarr_movie_by_path(video_path):
         return None
     
     try:
-        headers = {'X-Api-Key': RADARR_API_KEY}
-        response = requests.get(f"{RADARR_URL}/api/v3/movie", headers=headers, timeout=10)
-        response.raise_for_status()
-        movies = response.json()
-        
         # Normaliser le chemin recherché
         video_path_resolved = str(Path(video_path).resolve())
         
-        for movie in movies:
-            if not movie.get('hasFile'):
-                continue
-            
-            # Récupérer le movieFile
-            movie_file = movie.get('movieFile')
-            if not movie_file:
-                continue
-            
-            radarr_file_path = movie_file.get('path', '')
-            if not radarr_file_path:
-                continue
-            
-            radarr_file_resolved = str(Path(radarr_file_path).resolve())
-            
-            if radarr_file_resolved == video_path_resolved:
+        movie = get_radarr_movie_index().get(video_path_resolved)
+        if movie:
+            return movie
+        
+        # Film importé après la construction de l'index: on le reconstruit,
+        # au plus une fois par RADARR_MISS_REFRESH_INTERVAL pour tous les workers
+        if shared_cache.get('radarr', 'miss_refresh') is None:
+            shared_cache.put('radarr', 'miss_refresh', True, ttl=RADARR_MISS_REFRESH_INTERVAL)
+            movie = get_radarr_movie_index(refresh=True).get(video_path_resolved)
+            if movie:
                 return movie
         
         logger.info(f"Aucun film Radarr trouvé pour: {video_path}")
@@ -60,15 +97,35 @@ def get_radarr_source_title(movie_id):
     if not RADARR_URL or not RADARR_API_KEY:
         return None
     
+    cached = shared_cache.get('radarr_source_title', str(movie_id))
+    if cached is not None:
+        # Une chaîne vide mémorise l'absence de sourceTitle
+        return cached or None
+    
+    source_title = _fetch_radarr_source_title(movie_id)
+    if source_title is not False:
+        shared_cache.put(
+            'radarr_source_title', str(movie_id), source_title or '',
+            ttl=SOURCE_TITLE_CACHE_TTL
+        )
+    return source_title or None
+
+
+def _fetch_radarr_source_title(movie_id):
+    """
+    Interroge l'historique Radarr. Retourne le sourceTitle, None s'il n'y en
+    a pas, ou False en cas d'erreur (à ne pas mettre en cache).
+    """
     try:
         headers = {'X-Api-Key': RADARR_API_KEY}
-        response = requests.get(
-            f"{RADARR_URL}/api/v3/history/movie",
-            headers=headers,
-            params={'movieId': movie_id},
-            timeout=10
-        )
-        response.raise_for_status()
+        with metrics.http_call('radarr', 'history'):
+            response = requests.get(
+                f"{RADARR_URL}/api/v3/history/movie",
+                headers=headers,
+                params={'movieId': movie_id},
+                timeout=10
+            )
+            response.raise_for_status()
         history = response.json()
         
         if not history:
@@ -100,7 +157,92 @@ def get_radarr_source_title(movie_id):
             
     except Exception as e:
         logger.error(f"Erreur lors de la récupération du sourceTitle: {e}")
-        return None
+        return False
+
+
+def prefetch_source_titles(movie_ids, page_size=1000, max_pages=20):
+    """
+    Remplit le cache des sourceTitle de plusieurs films en parcourant
+    l'historique paginé (/api/v3/history, plus récent en premier) au lieu
+    d'un appel /history/movie par film.
+
+    Retourne le nombre de sourceTitle mis en cache.
+    """
+    if not RADARR_URL or not RADARR_API_KEY:
+        return 0
+    
+    wanted = {str(movie_id) for movie_id in movie_ids}
+    wanted -= set(shared_cache.get_many('radarr_source_title', wanted))
+    if not wanted:
+        return 0
+    
+    headers = {'X-Api-Key': RADARR_API_KEY}
+    latest = {}
+    exhausted = False
+    try:
+        for page in range(1, max_pages + 1):
+            with metrics.http_call('radarr', 'history_paged'):
+                response = requests.get(
+                    f"{RADARR_URL}/api/v3/history",
+                    headers=headers,
+                    params={
+                        'page': page,
+                        'pageSize': page_size,
+                        'sortKey': 'date',
+                        'sortDirection': 'descending'
+                    },
+                    timeout=30
+                )
+                response.raise_for_status()
+            data = response.json()
+            records = data.get('records', [])
+            
+            for event in records:
+                movie_id = str(event.get('movieId'))
+                if movie_id not in wanted:
+                    continue
+                if event.get('eventType') not in ['grabbed', 'downloadFolderImported']:
+                    continue
+                source_title = (event.get('sourceTitle') or '').strip()
+                if source_title and event.get('date', '') > latest.get(movie_id, ('', ''))[0]:
+                    latest[movie_id] = (event.get('date', ''), source_title)
+            
+            if page * page_size >= data.get('totalRecords', 0) or not records:
+                exhausted = True
+                break
+            if wanted <= set(latest):
+                break
+    except Exception as e:
+        logger.error(f"Erreur lors du parcours de l'historique Radarr: {e}")
+    
+    values = {movie_id: title for movie_id, (_, title) in latest.items()}
+    if exhausted:
+        # Historique complet parcouru: les films restants n'ont pas de sourceTitle
+        values.update({movie_id: '' for movie_id in wanted - set(latest)})
+    if values:
+        shared_cache.put_many('radarr_source_title', values, ttl=SOURCE_TITLE_CACHE_TTL)
+    logger.info(f"sourceTitle préchargés: {len(latest)}/{len(wanted)} films")
+    return len(latest)
+
+
+def get_cached_release_names(movies):
+    """
+    Noms de release de plusieurs films sans appel réseau: le sourceTitle
+    s'il est déjà en cache, sinon le nom généré à partir des métadonnées.
+
+    Retourne {movie_id: (nom, True si c'est un sourceTitle)}.
+    """
+    source_titles = shared_cache.get_many(
+        'radarr_source_title', [str(movie.get('id')) for movie in movies]
+    )
+    names = {}
+    for movie in movies:
+        source_title = source_titles.get(str(movie.get('id')))
+        if source_title:
+            names[movie.get('id')] = (source_title, True)
+        else:
+            names[movie.get('id')] = (generate_radarr_name(movie), False)
+    return names
 
 
 def generate_radarr_name(movie):
@@ -0,0 +1,114 @@
+import logging
+import os
+from pathlib import Path
+
+from utils import manifest, radarr_integration, shared_cache
+from utils.directory_listing import list_directory
+
+logger = logging.getLogger(__name__)
+
+
+def _torrent_folders(torrent_path):
+    """Names of the release folders in TORRENT_PATH (cached listing)"""
+    try:
+        listing, _ = list_directory(torrent_path, ())
+    except OSError:
+        return set()
+    return {item['name'] for item in listing if item['type'] == 'directory'}
+
+
+def _movie_index(use_radarr):
+    if not (use_radarr and radarr_integration.RADARR_URL and radarr_integration.RADARR_API_KEY):
+        return {}
+    index = shared_cache.get('radarr', 'movie_index', memo=True)
+    if index is None:
+        try:
+            index = radarr_integration.get_radarr_movie_index()
+        except Exception as e:
+            logger.warning(f"Radarr index unavailable, release names from filenames: {e}")
+            return {}
+    return index
+
+
+def annotate(items, torrent_path, use_radarr):
+    """
+    Add processing status and release name to the files of a listing.
+
+    Everything comes from indexes that are already built: the manifest of
+    processed releases (and their sizes, for duplicates), the cached Radarr
+    index and sourceTitles, and one (cached) listing of TORRENT_PATH. No
+    file is stat'ed and Radarr is never called per file.
+
+    Args:
+        items: Listing entries ({'name', 'path', 'type', ...})
+        torrent_path: Root of the release folders
+        use_radarr: Resolve release names through Radarr like /create does
+
+    Returns:
+        New list of entries; files gain 'release_name', 'release_name_source'
+        ('manifest', 'radarr_source_title', 'radarr' or 'filename') and
+        'status' ({'processed', 'outputs', 'torrent_folder',
+        'possible_duplicate_of'})
+    """
+    # Resolve each parent directory once rather than every file
+    real_dirs = {}
+    source_keys = {}
+    for item in items:
+        if item['type'] != 'file':
+            continue
+        parent = os.path.dirname(item['path'])
+        if parent not in real_dirs:
+            real_dirs[parent] = os.path.realpath(parent)
+        source_keys[item['path']] = os.path.join(real_dirs[parent], item['name'])
+
+    if not source_keys:
+        return list(items)
+
+    outputs = manifest.outputs_for(source_keys.values())
+    movie_index = _movie_index(use_radarr)
+    movies = [movie_index[key] for key in source_keys.values() if key in movie_index]
+    radarr_names = radarr_integration.get_cached_release_names(movies) if movies else {}
+    folders = _torrent_folders(torrent_path)
+    same_size = manifest.fingerprinted_sizes(
+        item['size'] for item in items if item['type'] == 'file' and 'size' in item
+    )
+
+    annotated = []
+    for item in items:
+        if item['type'] != 'file':
+            annotated.append(item)
+            continue
+
+        key = source_keys[item['path']]
+        recorded = outputs.get(key)
+        movie = movie_index.get(key)
+        if recorded and recorded.get('release_name'):
+            release_name, source = recorded['release_name'], 'manifest'
+        elif movie:
+            release_name, from_history = radarr_names[movie.get('id')]
+            source = 'radarr_source_title' if from_history else 'radarr'
+        else:
+            release_name, source = Path(item['name']).stem, 'filename'
+
+        kinds = recorded['kinds'] if recorded else []
+        # Same size as another processed file (and same sampled chunks when
+        # this file was processed too); /create confirms before hashing
+        candidates = same_size.get(item.get('size'), {})
+        own_sample = candidates.get(key)
+        possible_duplicates = [
+            path for path, sample in candidates.items()
+            if path != key and (own_sample is None or sample == own_sample)
+        ]
+        annotated.append({
+            **item,
+            'release_name': release_name,
+            'release_name_source': source,
+            'status': {
+                'processed': 'torrent' in kinds or release_name in folders,
+                'outputs': kinds,
+                'torrent_folder': release_name in folders,
+                'possible_duplicate_of': possible_duplicates
+            }
+        })
+
+    return annotated
@@ -0,0 +1,256 @@
+"""
+Remote hashing worker: runs piece hashing and mediainfo next to the disks.
+
+The worker is this app's code started in worker mode on the storage host:
+
+    WORKER_ROOTS=/mnt/user/media,/mnt/user/torrents python -m utils.remote_worker
+
+The main instance sends jobs to it over HTTP when HASH_WORKER_URL is set.
+Hashing progress is streamed back as newline-delimited JSON; the main
+instance builds the .torrent from the returned piece hashes. When the
+worker cannot be reached, everything runs locally as before.
+"""
+import argparse
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import requests
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Main instance side
+HASH_WORKER_URL = os.getenv('HASH_WORKER_URL', '').rstrip('/')
+HASH_WORKER_TOKEN = os.getenv('HASH_WORKER_TOKEN', '')
+# "local prefix=worker prefix" pairs, comma-separated, for paths that are
+# mounted elsewhere on the storage host (e.g. /media=/mnt/user/media)
+HASH_WORKER_PATH_MAP = [
+    tuple(pair.split('=', 1))
+    for pair in os.getenv('HASH_WORKER_PATH_MAP', '').split(',')
+    if '=' in pair
+]
+
+# Worker side
+WORKER_PORT = int(os.getenv('WORKER_PORT', '5001'))
+# /create hashes the renamed file under TORRENT_PATH, so both roots are needed
+WORKER_ROOTS = [
+    os.path.realpath(root)
+    for root in os.getenv(
+        'WORKER_ROOTS', f"{os.getenv('MEDIA_PATH', '/media')},{os.getenv('TORRENT_PATH', '/torrents')}"
+    ).split(',')
+    if root
+]
+PROGRESS_INTERVAL = 0.5
+
+
+class WorkerUnavailable(Exception):
+    """The worker could not be reached or failed; the caller runs the job locally"""
+
+
+def enabled():
+    return bool(HASH_WORKER_URL)
+
+
+def worker_path(path):
+    """Path of a local file as seen by the worker"""
+    path = str(path)
+    for local, remote in HASH_WORKER_PATH_MAP:
+        local = local.rstrip('/')
+        if path == local or path.startswith(local + '/'):
+            return remote.rstrip('/') + path[len(local):]
+    return path
+
+
+def _local_paths(output):
+    """Worker paths embedded in a probe output, mapped back to local paths"""
+    for local, remote in HASH_WORKER_PATH_MAP:
+        output = output.replace(remote.rstrip('/') + '/', local.rstrip('/') + '/')
+    return output
+
+
+def _raise_for_status(response, path):
+    if response.status_code == 403:
+        raise WorkerUnavailable(f"{worker_path(path)} is outside the worker's WORKER_ROOTS, "
+                                f"which must include the media and torrents folders")
+    response.raise_for_status()
+
+
+def _headers():
+    return {'X-Worker-Token': HASH_WORKER_TOKEN} if HASH_WORKER_TOKEN else {}
+
+
+def hash_file(path, piece_length, with_digests=False, progress=None):
+    """
+    Hash a file on the worker
+
+    Args:
+        path: Local path of the file
+        piece_length: Torrent piece length in bytes (None for checksums only)
+        with_digests: Also compute CRC32 and SHA-256
+        progress: Optional callable(hashed_bytes, total_bytes)
+
+    Returns:
+        tuple (pieces, digests) as returned by torrent_creator.hash_file
+
+    Raises:
+        WorkerUnavailable
+    """
+    payload = {'path': worker_path(path), 'piece_length': piece_length, 'digests': with_digests}
+    try:
+        with metrics.http_call('hash_worker', 'hash'):
+            response = requests.post(
+                f"{HASH_WORKER_URL}/hash", json=payload, headers=_headers(),
+                stream=True, timeout=(5, 60)
+            )
+            _raise_for_status(response, path)
+            with response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event['event'] == 'progress':
+                        if progress:
+                            progress(event['bytes'], event['total'])
+                    elif event['event'] == 'result':
+                        return event['pieces'], event['digests']
+                    elif event['event'] == 'error':
+                        raise WorkerUnavailable(event['error'])
+    except WorkerUnavailable:
+        raise
+    except Exception as e:
+        raise WorkerUnavailable(str(e)) from e
+    raise WorkerUnavailable('Worker closed the stream without a result')
+
+
+def probe(path, output_format):
+    """
+    mediainfo output of a file, run on the worker, with the worker's paths
+    mapped back to local ones so the cached probe matches a local run
+
+    Raises:
+        WorkerUnavailable
+    """
+    try:
+        with metrics.http_call('hash_worker', 'probe'):
+            response = requests.post(
+                f"{HASH_WORKER_URL}/probe",
+                json={'path': worker_path(path), 'format': output_format},
+                headers=_headers(), timeout=(5, 120)
+            )
+            _raise_for_status(response, path)
+        return _local_paths(response.json()['output'])
+    except WorkerUnavailable:
+        raise
+    except Exception as e:
+        raise WorkerUnavailable(str(e)) from e
+
+
+def _allowed(path):
+    real = os.path.realpath(path)
+    return any(real == root or real.startswith(root.rstrip('/') + '/') for root in WORKER_ROOTS)
+
+
+def create_worker_app():
+    """Flask app of the worker process"""
+    from flask import Flask, Response, abort, jsonify, request
+
+    from utils import media_probe
+    from utils.torrent_creator import hash_file as hash_local
+
+    # The worker runs everything locally, even if the environment is shared
+    global HASH_WORKER_URL
+    HASH_WORKER_URL = ''
+
+    app = Flask(__name__)
+
+    @app.before_request
+    def check_token():
+        if request.path == '/health':
+            return None
+        token = request.headers.get('X-Worker-Token', '')
+        if HASH_WORKER_TOKEN and not hmac.compare_digest(token, HASH_WORKER_TOKEN):
+            abort(401)
+
+        data = request.get_json(force=True, silent=True) or {}
+        path = data.get('path')
+        if not path or not _allowed(path):
+            logger.warning(f"Rejected {path}: outside WORKER_ROOTS ({', '.join(WORKER_ROOTS)}), "
+                           f"which must include the media and torrents folders")
+            abort(403)
+        if not os.path.isfile(path):
+            abort(404)
+        return None
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'ok', 'roots': WORKER_ROOTS})
+
+    @app.route('/probe', methods=['POST'])
+    def probe_route():
+        data = request.get_json(force=True)
+        output_format = data.get('format', 'full')
+        if output_format not in media_probe.FORMAT_ARGS:
+            abort(400)
+        return jsonify({'output': media_probe.run_mediainfo(data['path'], output_format)})
+
+    @app.route('/hash', methods=['POST'])
+    def hash_route():
+        data = request.get_json(force=True)
+        path = data['path']
+        total = os.path.getsize(path)
+        events = queue.Queue()
+        hashed = [0]
+
+        def run():
+            try:
+                pieces, digests = hash_local(
+                    path, data.get('piece_length'),
+                    with_digests=bool(data.get('digests')),
+                    progress=lambda done, _: hashed.__setitem__(0, done)
+                )
+                events.put({'event': 'result', 'pieces': pieces, 'digests': digests})
+            except Exception as e:
+                logger.exception(f"Hashing {path} failed")
+                events.put({'event': 'error', 'error': str(e)})
+
+        def stream():
+            logger.info(f"Hashing {path} ({total / 1024 ** 3:.1f} GB)")
+            start = time.monotonic()
+            threading.Thread(target=run, name='remote-hash', daemon=True).start()
+            while True:
+                try:
+                    event = events.get(timeout=PROGRESS_INTERVAL)
+                except queue.Empty:
+                    # Also keeps the connection alive while the disk is slow
+                    event = {'event': 'progress', 'bytes': hashed[0], 'total': total}
+                yield json.dumps(event) + '\n'
+                if event['event'] != 'progress':
+                    logger.info(f"Hashed {path} in {time.monotonic() - start:.1f}s")
+                    return
+
+        return Response(stream(), mimetype='application/x-ndjson')
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the remote hashing worker')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=WORKER_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not HASH_WORKER_TOKEN:
+        logger.warning('HASH_WORKER_TOKEN is not set: any host on the network can submit jobs')
+    logger.info(f"Hashing worker serving {', '.join(WORKER_ROOTS)} on {args.host}:{args.port}")
+    create_worker_app().run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
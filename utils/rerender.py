@@ -0,0 +1,204 @@
+"""
+Bulk re-render of the descriptions and NFOs of every processed release.
+
+Uses only cached data: mediainfo probes from the probe cache, Radarr
+metadata recorded in the manifest and TMDb responses from the cache (even
+expired ones). Outputs whose rendered content did not change are left
+untouched.
+
+Usage:
+
+    python -m utils.rerender [--kinds bbcode,nfo] [--dry-run]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils import manifest, media_probe
+from utils.atomic_io import atomic_write_text
+from utils.bbcode_generator import generate_bbcode_description
+from utils.nfo_generator import parse_added_on, render_nfo
+
+logger = logging.getLogger(__name__)
+
+RERENDER_WORKERS = int(os.getenv('RERENDER_WORKERS', str(min(32, (os.cpu_count() or 1) * 2))))
+KINDS = ('bbcode', 'nfo')
+# mediainfo output each kind is rendered from
+PROBE_FORMATS = {'bbcode': 'json', 'nfo': 'full'}
+
+_run_lock = threading.Lock()
+
+
+def _legacy_releases(known):
+    """
+    Releases processed before their inputs were recorded: rebuilt from the
+    manifest outputs (video next to the NFO, no Radarr metadata)
+    """
+    legacy = []
+    for source_path, release_name in manifest.release_names().items():
+        if source_path in known:
+            continue
+        record = manifest.get_output(source_path, 'nfo') or manifest.get_output(source_path, 'bbcode')
+        if not record:
+            continue
+        legacy.append({
+            'source_path': source_path,
+            'release_name': release_name,
+            'video_path': str(Path(record['path']).parent / f"{release_name}{Path(source_path).suffix}"),
+            'original_filename': Path(source_path).name,
+            'radarr_movie': None
+        })
+    return legacy
+
+
+def _video_path(release):
+    """The renamed video next to the outputs, or the source if it is gone"""
+    if Path(release['video_path']).exists():
+        return release['video_path']
+    return release['source_path']
+
+
+def _render(kind, release, video_path, output_path, existing, nfo_template):
+    if kind == 'nfo':
+        return render_nfo(video_path, nfo_template, {
+            'release_name': release['release_name'],
+            'folder_name': str(Path(output_path).parent),
+            'original_filename': release['original_filename'],
+            'radarr_movie': release['radarr_movie'],
+            'added_on': parse_added_on(existing) if existing else None
+        })
+    return generate_bbcode_description(
+        video_path,
+        radarr_movie=release['radarr_movie'],
+        release_name=release['release_name'],
+        stale_ok=True
+    )
+
+
+def rerender_release(release, kinds=KINDS, nfo_template='full', dry_run=False):
+    """
+    Re-render the outputs of one release
+
+    Returns:
+        dict {kind: 'rewritten' | 'unchanged' | 'missing' | 'failed'} plus
+        source_path and, for failures, error
+    """
+    status = {'source_path': release['source_path']}
+
+    video_path = _video_path(release)
+
+    for kind in kinds:
+        record = manifest.get_output(release['source_path'], kind)
+        if not record:
+            status[kind] = 'missing'
+            continue
+        output_path = record['path']
+
+        try:
+            try:
+                existing = Path(output_path).read_text(encoding='utf-8')
+            except FileNotFoundError:
+                existing = None
+
+            content = _render(kind, release, video_path, output_path, existing, nfo_template)
+            if content is None:
+                raise RuntimeError(f"{kind} rendering failed")
+
+            if content == existing:
+                status[kind] = 'unchanged'
+                continue
+
+            if not dry_run:
+                atomic_write_text(output_path, content)
+                # Same inputs, new content: later /create runs reuse it
+                manifest.record_output(
+                    release['source_path'], kind, record['input_key'], output_path,
+                    release['release_name']
+                )
+            status[kind] = 'rewritten'
+
+        except Exception as e:
+            logger.error(f"Re-render of {kind} failed for {release['source_path']}: {e}")
+            status[kind] = 'failed'
+            status['error'] = str(e)
+
+    return status
+
+
+def rerender_all(kinds=KINDS, nfo_template='full', dry_run=False, workers=RERENDER_WORKERS):
+    """
+    Re-render every processed release in parallel
+
+    Returns:
+        dict with per-status counts, the rewritten and failed source paths,
+        and the duration; None if a run is already in progress
+    """
+    if not _run_lock.acquire(blocking=False):
+        return None
+    try:
+        start = time.monotonic()
+        recorded = manifest.releases()
+        known = {release['source_path'] for release in recorded}
+        all_releases = recorded + _legacy_releases(known)
+
+        # Probes missing from the cache, a batch of files per mediainfo run
+        media_probe.probe_many(
+            [_video_path(release) for release in all_releases],
+            formats=tuple({PROBE_FORMATS[kind] for kind in kinds})
+        )
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='rerender') as pool:
+            statuses = list(pool.map(
+                lambda release: rerender_release(release, kinds, nfo_template, dry_run),
+                all_releases
+            ))
+    finally:
+        _run_lock.release()
+
+    summary = {
+        'releases': len(statuses),
+        'dry_run': dry_run,
+        'counts': {kind: {} for kind in kinds},
+        'rewritten': [],
+        'failed': [],
+        'seconds': round(time.monotonic() - start, 3)
+    }
+    for status in statuses:
+        for kind in kinds:
+            counts = summary['counts'][kind]
+            counts[status[kind]] = counts.get(status[kind], 0) + 1
+        if any(status[kind] == 'rewritten' for kind in kinds):
+            summary['rewritten'].append(status['source_path'])
+        if 'error' in status:
+            summary['failed'].append({'source_path': status['source_path'], 'error': status['error']})
+
+    logger.info(
+        f"Re-render of {summary['releases']} releases in {summary['seconds']}s: "
+        f"{len(summary['rewritten'])} changed, {len(summary['failed'])} failed"
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-render descriptions and NFOs from cached data')
+    parser.add_argument('--kinds', default=','.join(KINDS), help='comma-separated: bbcode,nfo')
+    parser.add_argument('--nfo-template', default=os.getenv('NFO_TEMPLATE', 'full'))
+    parser.add_argument('--workers', type=int, default=RERENDER_WORKERS)
+    parser.add_argument('--dry-run', action='store_true', help='report changes without writing')
+    args = parser.parse_args()
+
+    kinds = tuple(k.strip() for k in args.kinds.split(',') if k.strip())
+    if not kinds or any(k not in KINDS for k in kinds):
+        parser.error(f"kinds must be among {', '.join(KINDS)}")
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(rerender_all(kinds, args.nfo_template, args.dry_run, args.workers), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils import timeline
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+CACHE_DB = os.path.join(CONFIG_PATH, 'cache.db')
+# Expired entries stay readable with stale_ok this long before being deleted
+CACHE_STALE_KEEP = int(os.getenv('CACHE_STALE_KEEP', str(7 * 86400)))
+# Entries keyed by file identity never expire; keep the newest this many per namespace
+CACHE_MAX_FILE_ENTRIES = int(os.getenv('CACHE_MAX_FILE_ENTRIES', '20000'))
+CACHE_PURGE_INTERVAL = int(os.getenv('CACHE_PURGE_INTERVAL', '3600'))
+FILE_NAMESPACES = ('probe', 'pieces', 'sample', 'checksums')
+
+_last_maintenance = 0
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+# Per-process copies of large, frequently read entries (see get(memo=True))
+_memo = {}
+_memo_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+
+def _connect():
+    """
+    Open the cache database shared by every worker process.
+
+    WAL mode lets any number of readers proceed while one worker writes.
+    """
+    global _schema_ready
+
+    conn = sqlite3.connect(CACHE_DB, timeout=30)
+
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                Path(CACHE_DB).parent.mkdir(parents=True, exist_ok=True)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+                conn.commit()
+                _schema_ready = True
+
+    return conn
+
+
+def get(namespace, key, memo=False, stale_ok=False):
+    """
+    Return a cached value, or None if missing or expired
+
+    Args:
+        namespace: Cache namespace (radarr, tmdb, probe, pieces, ...)
+        key: Entry key within the namespace
+        memo: Keep a decoded copy in this process and only re-read the
+              value when another worker has replaced it. Meant for large
+              entries read on every request, such as the Radarr index.
+        stale_ok: Also return an expired entry (bulk jobs that prefer
+                  slightly old metadata to a network call)
+    """
+    value = _read(namespace, key, memo, stale_ok)
+    timeline.count(f"cache_{'miss' if value is None else 'hit'}:{namespace}")
+    return value
+
+
+def _read(namespace, key, memo, stale_ok):
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT stored_at, expires_at FROM cache WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+            if not row:
+                return None
+
+            stored_at, expires_at = row
+            if expires_at is not None and expires_at < time.time() and not stale_ok:
+                return None
+
+            if memo:
+                with _memo_lock:
+                    hit = _memo.get((namespace, key))
+                if hit and hit[0] == stored_at:
+                    return hit[1]
+
+            value_row = conn.execute(
+                'SELECT value FROM cache WHERE namespace = ? AND key = ? AND stored_at = ?',
+                (namespace, key, stored_at)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if not value_row:
+            return None
+        value = json.loads(value_row[0])
+
+        if memo:
+            with _memo_lock:
+                _memo[(namespace, key)] = (stored_at, value)
+        return value
+
+    except Exception as e:
+        logger.warning(f"Cache read failed ({namespace}/{key}): {e}")
+        return None
+
+
+def put(namespace, key, value, ttl=None):
+    """Store a JSON-serialisable value, optionally expiring after ttl seconds"""
+    try:
+        now = time.time()
+        payload = json.dumps(value)
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (namespace, key, payload, now, now + ttl if ttl else None)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache write failed ({namespace}/{key}): {e}")
+        return False
+
+
+def get_many(namespace, keys):
+    """
+    Return {key: value} for the entries of keys that are cached and not
+    expired, in one query per 500 keys
+    """
+    keys = list(dict.fromkeys(keys))
+    found = {}
+    try:
+        conn = _connect()
+        try:
+            now = time.time()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM cache WHERE namespace = ? "
+                    f"AND key IN ({','.join('?' * len(chunk))}) "
+                    f"AND (expires_at IS NULL OR expires_at >= ?)",
+                    (namespace, *chunk, now)
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Cache read failed ({namespace}, {len(keys)} keys): {e}")
+    timeline.count(f"cache_hit:{namespace}", len(found))
+    timeline.count(f"cache_miss:{namespace}", len(keys) - len(found))
+    return found
+
+
+def put_many(namespace, values, ttl=None):
+    """Store several {key: value} entries in one transaction"""
+    try:
+        now = time.time()
+        conn = _connect()
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(namespace, key, json.dumps(value), now, now + ttl if ttl else None)
+                 for key, value in values.items()]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache write failed ({namespace}, {len(values)} keys): {e}")
+        return False
+
+
+def delete(namespace, key=None):
+    """Drop one entry, or a whole namespace when key is None"""
+    try:
+        conn = _connect()
+        try:
+            if key is None:
+                conn.execute('DELETE FROM cache WHERE namespace = ?', (namespace,))
+            else:
+                conn.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Cache delete failed ({namespace}/{key}): {e}")
+
+
+def purge_expired(keep=CACHE_STALE_KEEP):
+    """Delete entries expired more than keep seconds ago; returns the count"""
+    conn = _connect()
+    try:
+        deleted = conn.execute(
+            'DELETE FROM cache WHERE expires_at < ?', (time.time() - keep,)
+        ).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return deleted
+
+
+def prune(namespace, max_entries):
+    """Keep only the max_entries most recently stored entries of a namespace"""
+    conn = _connect()
+    try:
+        deleted = conn.execute(
+            'DELETE FROM cache WHERE namespace = ? AND key NOT IN ('
+            'SELECT key FROM cache WHERE namespace = ? ORDER BY stored_at DESC LIMIT ?)',
+            (namespace, namespace, max_entries)
+        ).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return deleted
+
+
+def maintain():
+    """
+    Bound the size of cache.db: purge expired entries and cap the
+    namespaces keyed by file identity, at most every CACHE_PURGE_INTERVAL
+    seconds. Called from a background loop; freed pages are reused by
+    later writes.
+    """
+    global _last_maintenance
+    if time.monotonic() - _last_maintenance < CACHE_PURGE_INTERVAL and _last_maintenance:
+        return
+    _last_maintenance = time.monotonic()
+    try:
+        deleted = purge_expired()
+        if CACHE_MAX_FILE_ENTRIES > 0:
+            deleted += sum(prune(namespace, CACHE_MAX_FILE_ENTRIES) for namespace in FILE_NAMESPACES)
+    except Exception as e:
+        logger.warning(f"Cache maintenance failed: {e}")
+        return
+    if deleted:
+        logger.info(f"Cache maintenance: {deleted} entries removed")
+
+
+def file_key(path):
+    """Cache key identifying a file's content by inode, size and mtime"""
+    st = os.stat(path)
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
@@ -0,0 +1,102 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Timeline of the request being processed in this thread, if one is recorded
+_current = contextvars.ContextVar('timeline', default=None)
+
+# Counters of bytes read from local disks (bytes_hashed_remote is read by
+# the remote hashing worker)
+LOCAL_READ_COUNTERS = ('bytes_hashed', 'bytes_copied', 'bytes_sampled')
+
+
+class Timeline:
+    """
+    Spans (stages, subprocesses, HTTP calls, ...) and counters (bytes read,
+    cache hits and misses) recorded while handling one request. Times are
+    seconds relative to the start of the timeline.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+
+    def add_span(self, kind, name, start, end, **attrs):
+        """Record a span from perf_counter() start/end values"""
+        span = {
+            'kind': kind,
+            'name': name,
+            'start': round(start - self._origin, 6),
+            'end': round(end - self._origin, 6),
+            'duration': round(end - start, 6)
+        }
+        span.update(attrs)
+        self.spans.append(span)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def elapsed(self):
+        return time.perf_counter() - self._origin
+
+    def summary(self):
+        """
+        Split wall time between subprocesses, network and everything else
+        (Python code, disk I/O, lock waits)
+        """
+        total = self.elapsed()
+        by_kind = {}
+        calls = {}
+        for span in self.spans:
+            if span['kind'] in ('subprocess', 'http'):
+                by_kind[span['kind']] = by_kind.get(span['kind'], 0.0) + span['duration']
+                calls[span['kind']] = calls.get(span['kind'], 0) + 1
+
+        cache = {}
+        for name, value in self.counters.items():
+            if name.startswith(('cache_hit:', 'cache_miss:')):
+                result, namespace = name[len('cache_'):].split(':', 1)
+                cache.setdefault(namespace, {'hit': 0, 'miss': 0})[result] = value
+
+        return {
+            'total_seconds': round(total, 6),
+            'subprocess_seconds': round(by_kind.get('subprocess', 0.0), 6),
+            'http_seconds': round(by_kind.get('http', 0.0), 6),
+            'other_seconds': round(max(0.0, total - sum(by_kind.values())), 6),
+            'subprocess_count': calls.get('subprocess', 0),
+            'http_count': calls.get('http', 0),
+            'bytes_read': sum(v for k, v in self.counters.items() if k in LOCAL_READ_COUNTERS),
+            'cache': cache
+        }
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at,
+            'summary': self.summary(),
+            'spans': self.spans,
+            'counters': self.counters
+        }
+
+
+def current():
+    """Timeline being recorded for the current request, or None"""
+    return _current.get()
+
+
+def count(name, amount=1):
+    """Add to a counter of the current timeline, if one is being recorded"""
+    timeline = _current.get()
+    if timeline is not None:
+        timeline.count(name, amount)
+
+
+@contextmanager
+def recording(timeline):
+    """Make timeline the current one for the duration of the block"""
+    token = _current.set(timeline)
+    try:
+        yield timeline
+    finally:
+        _current.reset(token)
@@ -1,45 +1,118 @@
+import os
+import hashlib
 import subprocess
 import logging
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
+from utils import bencode, metrics, remote_worker, shared_cache, timeline
+from utils.atomic_io import atomic_output, atomic_write_text
+
 logger = logging.getLogger(__name__)
 
-def create_torrent(video_path, output_path, tracker_url, piece_size=0, private=False):
+CHECKSUM_KINDS = ('sfv', 'sha256')
+HASH_THREADS = int(os.getenv('HASH_THREADS', str(min(8, os.cpu_count() or 1))))
+
+# mktorrent-like automatic piece length: (file size up to, log2 piece length)
+AUTO_PIECE_LENGTHS = [
+    (50 * 1024 ** 2, 15), (150 * 1024 ** 2, 16), (350 * 1024 ** 2, 17),
+    (512 * 1024 ** 2, 18), (1024 ** 3, 19), (2 * 1024 ** 3, 20),
+    (4 * 1024 ** 3, 21), (8 * 1024 ** 3, 22), (16 * 1024 ** 3, 23),
+]
+# Piece lengths mktorrent -l accepts (2^15 to 2^28)
+MIN_PIECE_LENGTH = 1 << 15
+MAX_PIECE_LENGTH = 1 << 28
+
+
+def create_torrent(video_path, output_path, tracker_url, piece_size=0, private=False, checksums=(),
+                   progress=None):
     """
     Create a torrent file using mktorrent
     
+    Piece hashes are cached across workers by file identity and requested
+    piece size, so re-creating a torrent for the same file (other tracker,
+    name or private flag) does not hash it again.
+    
+    When checksums are requested the file is hashed in-process instead, so
+    CRC32 and SHA-256 come from the same read as the piece hashes; they are
+    written as sidecars next to the torrent (<name>.sfv, <name>.sha256).
+    
+    With HASH_WORKER_URL set the file is hashed by the remote worker next
+    to the disks (see utils.remote_worker), falling back to local hashing
+    when it is unreachable.
+    
     Args:
         video_path: Path to video file
         output_path: Path where torrent file will be saved
         tracker_url: Tracker announce URL
         piece_size: Piece size in KB (0 for auto)
         private: Whether to create a private torrent
+        checksums: Sidecars to write, among 'sfv' and 'sha256'
+        progress: Optional callable(hashed_bytes, total_bytes), called when
+            the file is hashed in-process or by the remote worker
     
     Returns:
         dict with status and message
     """
     try:
-        cmd = ['mktorrent', '-o', output_path]
+        file_key = shared_cache.file_key(video_path)
+        # Resolved once: mktorrent, in-process and remote hashing (and the
+        # pre-hasher) all use this length, and the cache is keyed by it
+        length = piece_length(piece_size, os.path.getsize(video_path))
+        pieces_key = f"{file_key}:{length}"
+        cached_pieces = shared_cache.get('pieces', pieces_key)
+        piece_cache = 'hit' if cached_pieces else 'miss'
+        metrics.PIECE_CACHE.inc(result=piece_cache)
         
-        if tracker_url:
-            cmd.extend(['-a', tracker_url])
+        digests = shared_cache.get('checksums', file_key) if checksums else None
+        need_digests = bool(checksums) and digests is None
+        if need_digests or (not cached_pieces and remote_worker.enabled()):
+            # One pass for everything; piece hashes only if not cached
+            pieces, new_digests = _hash(
+                video_path,
+                None if cached_pieces else length,
+                need_digests,
+                progress
+            )
+            if new_digests:
+                digests = new_digests
+                shared_cache.put('checksums', file_key, digests)
+            if not cached_pieces:
+                cached_pieces = pieces
+                shared_cache.put('pieces', pieces_key, pieces)
         
-        if piece_size > 0:
-            cmd.extend(['-l', str(piece_size)])
-        
-        if private:
-            cmd.append('-p')
-        
-        cmd.append(video_path)
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        with atomic_output(output_path) as tmp_path:
+            if cached_pieces:
+                _write_torrent_from_pieces(
+                    video_path, tmp_path, tracker_url, private, cached_pieces
+                )
+            else:
+                start = time.perf_counter()
+                with metrics.HASH_SECONDS.time():
+                    _run_mktorrent(video_path, tmp_path, tracker_url, length, private)
+                metrics.observe_hashing(
+                    os.path.getsize(video_path), time.perf_counter() - start
+                )
+                _remember_pieces(tmp_path, pieces_key)
         
         logger.info(f"Torrent created successfully: {output_path}")
-        return {
+        result = {
             'success': True,
             'path': output_path,
-            'message': 'Torrent file created successfully'
+            'message': 'Torrent file created successfully',
+            'piece_cache': piece_cache
         }
+        if digests:
+            result['checksums'] = {
+                'crc32': digests['crc32'],
+                'sha256': digests['sha256'],
+                'files': write_checksum_sidecars(video_path, output_path, digests, checksums)
+            }
+        return result
         
     except subprocess.CalledProcessError as e:
         logger.error(f"Error creating torrent: {e.stderr}")
@@ -53,3 +126,196 @@ def create_torrent(video_path, output_path, tracker_url, piece_size=0, private=F
             'success': False,
             'error': str(e)
         }
+
+
+def piece_length(piece_size, file_size):
+    """
+    Piece length in bytes: values up to 28 are log2 exponents (mktorrent -l),
+    larger ones KB; 0 picks one from the file size
+
+    Raises:
+        ValueError if the length is not a power of two mktorrent accepts
+    """
+    if piece_size and piece_size <= 28:
+        length = 1 << piece_size
+    elif piece_size:
+        length = piece_size * 1024
+    else:
+        length = None
+    if length is not None:
+        if length & (length - 1) or not MIN_PIECE_LENGTH <= length <= MAX_PIECE_LENGTH:
+            raise ValueError(
+                f"Piece size must be a power of two between {MIN_PIECE_LENGTH // 1024} "
+                f"and {MAX_PIECE_LENGTH // 1024} KB (or 15-28 as log2)"
+            )
+        return length
+    for limit, exponent in AUTO_PIECE_LENGTHS:
+        if file_size <= limit:
+            return 1 << exponent
+    return 1 << 24
+
+
+def _hash(video_path, piece_length, with_digests, progress=None):
+    """hash_file() on the remote worker when configured, else locally"""
+    if remote_worker.enabled():
+        try:
+            hashed = remote_worker.hash_file(video_path, piece_length, with_digests, progress)
+            timeline.count('bytes_hashed_remote', os.path.getsize(video_path))
+            return hashed
+        except remote_worker.WorkerUnavailable as e:
+            logger.warning(f"Hashing worker unavailable, hashing locally: {e}")
+    return hash_file(video_path, piece_length, with_digests, progress)
+
+
+def hash_file(video_path, piece_length=None, with_digests=True, progress=None, observe=True):
+    """
+    Read a file once, sequentially, computing its torrent piece hashes when
+    piece_length is given and its CRC32 and SHA-256 when with_digests is set
+
+    Piece hashes run on a thread pool (hashlib releases the GIL), while the
+    whole-file checksums are updated in read order. Background reads pass
+    observe=False so they stay out of the hashing metrics.
+
+    Returns:
+        tuple (pieces dict as stored in the 'pieces' cache or None,
+               {'crc32': hex, 'sha256': hex} or None)
+    """
+    chunk_size = piece_length or 4 * 1024 * 1024
+    crc = 0
+    sha256 = hashlib.sha256()
+    piece_hashes = []
+    pending = deque()
+    size = 0
+    total = os.path.getsize(video_path)
+    
+    start = time.perf_counter()
+    timed = metrics.HASH_SECONDS.time(span=('hash', 'piece hashing')) if observe else nullcontext()
+    with timed, \
+            ThreadPoolExecutor(max_workers=max(1, HASH_THREADS), thread_name_prefix='hash') as pool, \
+            open(video_path, 'rb', buffering=0) as f:
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except (AttributeError, OSError):
+            pass
+        
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # A short read mid-file would shift piece boundaries
+            while len(chunk) < chunk_size:
+                more = f.read(chunk_size - len(chunk))
+                if not more:
+                    break
+                chunk += more
+            size += len(chunk)
+            
+            if piece_length:
+                pending.append(pool.submit(lambda data: hashlib.sha1(data).digest(), chunk))
+                # Bound memory to a few pieces per hashing thread
+                while len(pending) > 2 * HASH_THREADS:
+                    piece_hashes.append(pending.popleft().result())
+            if with_digests:
+                crc = zlib.crc32(chunk, crc)
+                sha256.update(chunk)
+            if progress:
+                progress(size, total)
+        
+        piece_hashes.extend(future.result() for future in pending)
+    
+    if observe:
+        metrics.observe_hashing(size, time.perf_counter() - start)
+    
+    pieces = None
+    if piece_length:
+        pieces = {
+            'piece_length': piece_length,
+            'length': size,
+            'pieces': b''.join(piece_hashes).hex()
+        }
+    digests = None
+    if with_digests:
+        digests = {'crc32': f"{crc & 0xffffffff:08X}", 'sha256': sha256.hexdigest()}
+    return pieces, digests
+
+
+def write_checksum_sidecars(video_path, torrent_path, digests, kinds):
+    """
+    Write <torrent name>.sfv and/or <torrent name>.sha256 next to the
+    torrent, naming the file as it appears in the torrent
+
+    Returns:
+        list of written paths
+    """
+    base = Path(torrent_path).with_suffix('')
+    file_name = Path(video_path).name
+    contents = {
+        'sfv': f"; Generated by Torrent-nfo-creator\n{file_name} {digests['crc32']}\n",
+        'sha256': f"{digests['sha256']}  {file_name}\n",
+    }
+    written = []
+    for kind in kinds:
+        if kind not in contents:
+            continue
+        path = f"{base}.{kind}"
+        atomic_write_text(path, contents[kind])
+        written.append(path)
+    return written
+
+
+def _run_mktorrent(video_path, output_path, tracker_url, piece_length, private):
+    """Run mktorrent with a resolved piece length (bytes); output_path must not exist yet"""
+    cmd = ['mktorrent', '-o', output_path]
+    
+    if tracker_url:
+        cmd.extend(['-a', tracker_url])
+    
+    # Always explicit, so mktorrent's own automatic choice never differs
+    # from the one used for in-process hashing
+    cmd.extend(['-l', str(piece_length.bit_length() - 1)])
+    
+    if private:
+        cmd.append('-p')
+    
+    cmd.append(video_path)
+    
+    subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+
+def _remember_pieces(torrent_path, pieces_key):
+    """Store the piece layout of a freshly hashed torrent in the shared cache"""
+    try:
+        with open(torrent_path, 'rb') as f:
+            info = bencode.decode(f.read())['info']
+        shared_cache.put('pieces', pieces_key, {
+            'piece_length': info['piece length'],
+            'length': info['length'],
+            'pieces': info['pieces'].hex()
+        })
+    except Exception as e:
+        logger.warning(f"Could not cache piece hashes: {e}")
+
+
+def _write_torrent_from_pieces(video_path, output_path, tracker_url, private, cached):
+    """Build a single-file torrent from cached piece hashes, without reading the file"""
+    info = {
+        'name': Path(video_path).name,
+        'length': cached['length'],
+        'piece length': cached['piece_length'],
+        'pieces': bytes.fromhex(cached['pieces'])
+    }
+    if private:
+        info['private'] = 1
+    
+    torrent = {
+        'info': info,
+        'created by': 'Torrent-nfo-creator',
+        'creation date': int(time.time())
+    }
+    if tracker_url:
+        torrent['announce'] = tracker_url
+    
+    with open(output_path, 'wb') as f:
+        f.write(bencode.encode(torrent))
+        f.flush()
+        os.fsync(f.fileno())
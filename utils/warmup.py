@@ -0,0 +1,125 @@
+"""
+Startup warm-up: fills the Radarr index and sourceTitle caches and checks
+the external tools, so the first /create after a restart is not the slow
+one. Progress is reported by /ready.
+"""
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from utils import radarr_integration
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.getenv('CONFIG_PATH', '/config')
+REQUIRED_TOOLS = ('mediainfo', 'mktorrent')
+
+_state_lock = threading.Lock()
+_state = {'started_at': None, 'finished_at': None, 'steps': {}}
+_warmup_thread = None
+
+
+def _set_step(name, **fields):
+    with _state_lock:
+        _state['steps'].setdefault(name, {}).update(fields)
+
+
+def _run_step(name, func):
+    _set_step(name, status='running')
+    start = time.monotonic()
+    try:
+        detail = func()
+        _set_step(name, status='done', detail=detail, seconds=round(time.monotonic() - start, 3))
+    except Exception as e:
+        # Radarr being down must not keep the app from serving
+        logger.warning(f"Warm-up step {name} failed: {e}")
+        _set_step(name, status='failed', error=str(e), seconds=round(time.monotonic() - start, 3))
+
+
+def check_tools():
+    """Paths of the external tools; raises if one is missing"""
+    found = {tool: shutil.which(tool) for tool in REQUIRED_TOOLS}
+    missing = [tool for tool, path in found.items() if path is None]
+    if missing:
+        raise RuntimeError(f"not found in PATH: {', '.join(missing)}")
+    return found
+
+
+def _radarr_enabled():
+    return bool(radarr_integration.RADARR_URL and radarr_integration.RADARR_API_KEY)
+
+
+def warm_radarr_index():
+    if not _radarr_enabled():
+        return 'Radarr not configured'
+    return f"{len(radarr_integration.get_radarr_movie_index())} files"
+
+
+def warm_source_titles():
+    """sourceTitles of every movie with a file, from the paged history"""
+    if not _radarr_enabled():
+        return 'Radarr not configured'
+    index = radarr_integration.get_radarr_movie_index()
+    fetched = radarr_integration.prefetch_source_titles(movie['id'] for movie in index.values())
+    return f"{fetched} fetched"
+
+
+def run():
+    """Run every warm-up step once"""
+    with _state_lock:
+        _state['started_at'] = time.time()
+        _state['finished_at'] = None
+        _state['steps'] = {name: {'status': 'pending'} for name in ('tools', 'radarr_index', 'radarr_source_titles')}
+
+    _run_step('tools', check_tools)
+
+    # One process talks to Radarr; the others wait and find the cache warm
+    lock_path = os.path.join(CONFIG_PATH, 'locks', 'warmup.lock')
+    Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            _run_step('radarr_index', warm_radarr_index)
+            _run_step('radarr_source_titles', warm_source_titles)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    with _state_lock:
+        _state['finished_at'] = time.time()
+        seconds = _state['finished_at'] - _state['started_at']
+    logger.info(f"Warm-up finished in {seconds:.1f}s")
+
+
+def status():
+    """
+    Warm-up progress of this process
+
+    Returns:
+        dict with ready, started_at, finished_at and steps
+        ({name: {status, detail/error, seconds}}); ready once every step
+        has run and the required tools are present
+    """
+    with _state_lock:
+        steps = {name: dict(step) for name, step in _state['steps'].items()}
+        finished_at = _state['finished_at']
+        started_at = _state['started_at']
+    return {
+        'ready': finished_at is not None and steps.get('tools', {}).get('status') == 'done',
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'steps': steps
+    }
+
+
+def start_warmup():
+    """Run the warm-up once, from a daemon thread"""
+    global _warmup_thread
+    with _state_lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=run, name='warmup', daemon=True)
+    _warmup_thread.start()